@@ -0,0 +1,2 @@
+# Benchmarks for Mod Importer
+# Run from the repository root, e.g. `python -m benchmarks.mapper_decode`
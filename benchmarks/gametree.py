@@ -0,0 +1,108 @@
+# Synthetic game folder with mods using every modfile keyword
+# usage: python -m benchmarks.gametree folder [mod count]
+
+import json
+import os
+import random
+import sys
+
+import mapper
+
+from benchmarks import synthetic
+
+SCRIPTS = 10
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mode = "wb" if isinstance(content, bytes) else "w"
+    with open(path, mode, **({} if "b" in mode else {"encoding": "utf-8", "newline": "\n"})) as file:
+        file.write(content)
+
+def luatext(name, lines):
+    return f"-- {name}\n" + "".join(f"{name}Value{i} = {i}\n" for i in range(lines))
+
+def sjsontext(weapons, keys):
+    entries = ",\n".join(f'  {{\n    Name = "Weapon{i}"\n    Damage = {i % 97}\n    Tags = [ "a", "b" ]\n  }}'
+                         for i in range(weapons))
+    other = "".join(f"  Key{i} = {i}\n" for i in range(keys))
+    return f"Weapons = [\n{entries}\n]\nOther = {{\n{other}}}\n"
+
+def csvtext(rows, rng):
+    lines = ["Name,A,B,C"]
+    for i in range(rows):
+        lines.append(f"Row{i},{rng.randint(0, 99)},{rng.randint(0, 99)},{synthetic.single(rng)}")
+    return "\n".join(lines) + "\n"
+
+def modfiletext(i, sjson=True):
+    lines = [
+        f"Load Priority {10 * (i % 5)}",
+        'Import "script.lua"',
+        'Top Import "top.lua"',
+        f'To "Scripts/Script{i % SCRIPTS}.lua"',
+        'Import "extra"',
+        'To "Game/Units.xml"',
+        'XML "units.xml"',
+        'To "Game/Weapons.sjson"',
+        'SJSON "weapons.sjson"',
+        'To "Game/Table.csv"',
+        'CSV "table.csv"',
+        'To "Maps/Room.thing_bin"',
+        'Map "room.map.json"',
+        f'To "Scripts/Replaced{i}.lua"',
+        'Replace "replaced.lua"',
+        'Include "sub/modfile.txt"',
+    ]
+    if not sjson:
+        #modimporter rejects SJSON commands when the sjson module is missing
+        lines = [line for line in lines if "sjson" not in line and "sub/" not in line]
+    return "\n".join(lines) + "\n"
+
+def writemod(folder, i, rng, units, weapons, rows, obstacles, sjson=True):
+    write(f"{folder}/modfile.txt", modfiletext(i, sjson))
+    write(f"{folder}/sub/modfile.txt", 'Priority 200\nTo "Game/Weapons.sjson"\nSJSON "extra.sjson"\n')
+    write(f"{folder}/script.lua", luatext(f"Mod{i}", 20))
+    write(f"{folder}/top.lua", luatext(f"Mod{i}Top", 5))
+    write(f"{folder}/extra/first.lua", luatext(f"Mod{i}First", 5))
+    write(f"{folder}/extra/second.lua", luatext(f"Mod{i}Second", 5))
+    write(f"{folder}/replaced.lua", luatext(f"Mod{i}Replaced", 10))
+    unit = rng.randrange(units)
+    write(f"{folder}/units.xml", "<Game>\n" + "<Unit/>" * unit
+          + f'\n<Unit Health="{i}"><Weapon Damage="{i}"/></Unit>\n'
+          + f'<Mod{i} Name="Added"/>\n</Game>\n')
+    weapon = rng.randrange(weapons)
+    write(f"{folder}/weapons.sjson",
+          f'Weapons = [ "_search", [\n  {{ Name = "Weapon{weapon}" }},\n  {{ Damage = {i} }}\n] ]\n'
+          f'Mod{i} = [ "_append", 1, 2 ]\n')
+    write(f"{folder}/sub/extra.sjson", f'Other = {{\n  Key{i} = "_delete"\n  Mod{i} = {i}\n}}\n')
+    row = rng.randrange(1, rows + 1)
+    write(f"{folder}/table.csv", f"<{row},1>\n{i},_delete\n")
+    ids = [500000 + rng.randrange(obstacles) for x in range(3)]
+    appended = synthetic.obstacles(1, seed=1000 + i)[0]
+    appended["Id"] = 900000 + i
+    write(f"{folder}/room.map.json", json.dumps({"_delete": ids[:1],
+                                                 "_replace": [{"Id": ids[1], "Scale": 2.0}, {"Id": ids[2], "Name": f"Mod{i}"}],
+                                                 "_append": [appended]}))
+
+#build <folder>/Hades/Content and return its path
+def build(folder, mods=50, units=20000, weapons=5000, rows=20000, obstacles=20000, seed=0, sjson=True):
+    rng = random.Random(seed)
+    content = os.path.join(folder, "Hades", "Content")
+    write(f"{content}/Scripts/RoomManager.lua", luatext("RoomManager", 2000))
+    for i in range(SCRIPTS):
+        write(f"{content}/Scripts/Script{i}.lua", luatext(f"Script{i}", 500))
+    for i in range(mods):
+        write(f"{content}/Scripts/Replaced{i}.lua", luatext(f"Replaced{i}", 50))
+    write(f"{content}/Game/Units.xml", synthetic.xmltext(units, seed))
+    write(f"{content}/Game/Weapons.sjson", sjsontext(weapons, mods))
+    write(f"{content}/Game/Table.csv", csvtext(rows, rng))
+    write(f"{content}/Maps/Room.thing_bin", mapper.EncodeBinaries(synthetic.obstacles(obstacles, seed)))
+    for i in range(mods):
+        writemod(f"{content}/Mods/Mod{i}", i, rng, units, weapons, rows, obstacles, sjson)
+    return content
+
+def main(args):
+    content = build(args[0], int(args[1]) if len(args) > 1 else 50)
+    print(content)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
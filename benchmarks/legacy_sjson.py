@@ -0,0 +1,126 @@
+# SJSON merge of modimporter before documents were parsed once per base file,
+# each mod read, mapped and wrote the whole file, kept as the reference the
+# benchmarks check against
+
+from collections import OrderedDict
+
+import sjson
+
+DNE = ()
+
+reserved_sequence = "_sequence"
+reserved_append = "_append"
+reserved_replace = "_replace"
+reserved_delete = "_delete"
+reserved_search = "_search"
+
+def safeget(data,key):
+    if isinstance(data,list):
+        if isinstance(key,int):
+            if key < len(data) and key >= 0:
+                return data[key]
+        return DNE
+    if isinstance(data,OrderedDict):
+        return data.get(key,DNE)
+    return DNE
+
+def safepairs(data):
+    it = DNE
+    if isinstance(data,list):
+        it = enumerate(data)
+    if isinstance(data,OrderedDict):
+        it = data.items()
+    return it
+
+def clearDNE(data):
+    if isinstance(data,OrderedDict):
+        for k,v in data.copy().items():
+            if v is DNE:
+                del data[k]
+                continue
+            data[k] = clearDNE(v)
+    if isinstance(data,list):
+        L = []
+        for i,v in enumerate(data):
+            if v is DNE:
+                continue
+            L.append(clearDNE(v))
+        data = L
+    return data
+
+def readsjson(filename):
+    try:
+        return sjson.loads(open(filename,'r',encoding='utf-8-sig').read())
+    except sjson.ParseException:
+        return DNE
+
+def writesjson(filename,content):
+    if not isinstance(filename,str):
+        return
+    if isinstance(content,OrderedDict):
+        content = sjson.dumps(content, 2)
+    else:
+        content = ""
+    with open(filename,'w',encoding='utf-8') as f:
+        f.write(content)
+
+def sjsonsearch(indata,queries):
+    def pred(dat,mat):
+        if (it := safepairs(mat)) is not DNE:
+            return all(pred(dat[k],v) for k,v in it)
+        return dat == mat
+    for matdata,mapdata in queries:
+        for k,v in ((k,v) for k,v in safepairs(indata) if pred(v,matdata)):
+            indata[k] = sjsonmap(v,mapdata)
+    return indata
+
+def sjsonmap(indata,mapdata):
+    if mapdata is DNE:
+        return indata
+    elif mapdata==reserved_delete:
+        return DNE
+    elif safeget(mapdata,reserved_sequence):
+        S = []
+        for k,v in mapdata.items():
+            try:
+                d = int(k)-len(S)
+                if d>=0:
+                    S.extend([DNE]*(d+1))
+                S[int(k)]=v
+            except ValueError:
+                continue
+        mapdata = S
+    if type(indata)==type(mapdata):
+        if isinstance(mapdata,list) and safeget(mapdata,0) == reserved_append:
+            for i in range(1,len(mapdata)):
+                indata.append(mapdata[i])
+            return indata
+        if isinstance(mapdata,list):
+            if safeget(mapdata,0)==reserved_search:
+                search = mapdata[1]
+                return sjsonsearch(indata,zip(search[::2],search[1::2]))
+            if safeget(mapdata,0)==reserved_replace:
+                del mapdata[0]
+                return mapdata
+            indata.extend([DNE]*(len(mapdata)-len(indata)))
+        elif isinstance(mapdata,dict):
+            if search := safeget(mapdata,reserved_search):
+                return sjsonsearch(indata,zip(search[::2],search[1::2]))
+            if safeget(mapdata,reserved_replace):
+                del mapdata[reserved_replace]
+                return mapdata
+        if (it := safepairs(mapdata)) is not DNE:
+            for k,v in it:
+                indata[k] = sjsonmap(safeget(indata,k),v)
+            return indata
+    return mapdata
+
+def mergesjson(infile,mapfile):
+    indata = readsjson(infile)
+    if mapfile:
+        mapdata = readsjson(mapfile)
+    else:
+        mapdata = DNE
+    indata = sjsonmap(indata,mapdata)
+    indata = clearDNE(indata)
+    writesjson(infile,indata)
@@ -0,0 +1,41 @@
+# Character by character XML indentation styling of modimporter before the
+# streaming rewrite, kept as the reference the benchmarks check against
+
+import xml.etree.ElementTree as xml
+
+def writexml(filename,content,start=None):
+    if not isinstance(filename,str):
+        return
+    if not isinstance(content, xml.ElementTree):
+        return
+    content.write(filename)
+
+    #indentation styling
+    data = ""
+    if start:
+        data = start
+    with open(filename,'r',encoding='utf-8-sig') as file:
+        i = 0
+        for line in file:
+            nl = False
+            if len(line.replace('\t','').replace(' ',''))>1:
+                q=True
+                p=''
+                for s in line:
+                    if s == '\"':
+                        q = not q
+                    if p == '<' and q:
+                        if s == '/':
+                            i-=1
+                            data = data[:-1]
+                        else:
+                            i+=1
+                        data+=p
+                    if s == '>' and p == '/' and q:
+                        i-=1
+                    if p in (' ') or (s=='>' and p == '\"') and q:
+                        data+='\n'+'\t'*(i-(s=='/'))
+                    if s not in (' ','\t','<') or not q:
+                        data+=s
+                    p=s
+    open(filename,'w',encoding='utf-8').write(data)
@@ -0,0 +1,81 @@
+# Check that the mapper codecs match the reference codec byte for byte
+# usage: python -m benchmarks.mapper_compat [.thing_bin files or folders...]
+# folders are searched recursively, e.g. the game's Content/Maps folder
+# without arguments a synthetic corpus is checked
+
+import io
+import math
+import os
+import struct
+import sys
+import tempfile
+
+import mapper
+
+from benchmarks import legacy_mapper
+from benchmarks import synthetic
+
+SINGLES = [0, 0.0, -0.0, 1, -1, 0.5, -1.5, 3.14159, 1e-30, -1e30, 2.0 ** -149, 3.4e38, float("inf"), float("-inf")]
+STRINGS = ["", "a", "Obstacle01", "Help_Text ID", "x" * 300, "with\ttab and \"quotes\""]
+
+def check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+#the field by field readers read from the module-global file object f
+def readstring(module, data):
+    module.f = io.BytesIO(data)
+    return module.ReadString()
+
+def checkcodecs():
+    for value in SINGLES:
+        check(mapper.WriteSingle(value) == legacy_mapper.WriteSingle(value), f"WriteSingle({value!r})")
+    nan = mapper.WriteSingle(float("nan"))
+    check(math.isnan(struct.unpack("<f", nan)[0]), "WriteSingle(nan)")
+    for value in STRINGS:
+        data = legacy_mapper.WriteString(value)
+        check(mapper.WriteString(value) == data, f"WriteString({value!r})")
+        check(readstring(mapper, data) == readstring(legacy_mapper, data), f"ReadString({value!r})")
+        check(mapper.UnpackString(memoryview(data), 0) == (value, len(data)), f"UnpackString({value!r})")
+    #multi-byte characters are not supported by the reference codec
+    for value in ["Tartare", "ÉlysÉe", "冥界", "🗡"]:
+        data = mapper.WriteString(value)
+        check(readstring(mapper, data) == value, f"ReadString({value!r}) round trip")
+        check(mapper.UnpackString(memoryview(data), 0)[0] == value, f"UnpackString({value!r}) round trip")
+    print(f"codecs: {len(SINGLES)} floats, {len(STRINGS)} strings identical")
+
+def checkmap(path):
+    original = open(path, "rb").read()
+    obstacles = mapper.DecodeBinaries(path)
+    check(obstacles == legacy_mapper.DecodeBinaries(path), f"{path}: decoded obstacles differ")
+    encoded = mapper.EncodeBinaries(obstacles)
+    check(encoded == legacy_mapper.EncodeBinaries(obstacles), f"{path}: encoded binaries differ")
+    #unused bytes of the game's files are not necessarily null, so this is only reported
+    roundtrip = "reproduces the file" if encoded == original else "differs from the file in unused bytes"
+    print(f"{path}: {len(obstacles)} obstacles identical, re-encoding {roundtrip}")
+
+def corpus(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, folders, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(".thing_bin"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def main(args):
+    checkcodecs()
+    if args:
+        for path in corpus(args):
+            checkmap(path)
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        for seed in range(5):
+            path = os.path.join(folder, f"Synthetic{seed}.thing_bin")
+            with open(path, "wb") as file:
+                mapper.EncodeBinariesTo(file, synthetic.obstacles(300, seed))
+            checkmap(path)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,35 @@
+# Compare mapper.DecodeBinaries with the field by field reference decoder
+# usage: python -m benchmarks.mapper_decode [obstacle count | .thing_bin files...]
+
+import os
+import sys
+import tempfile
+
+import mapper
+
+from benchmarks.timing import timed
+from benchmarks import legacy_mapper
+from benchmarks import synthetic
+
+def compare(path):
+    expected, reference = timed(legacy_mapper.DecodeBinaries, path)
+    actual, current = timed(mapper.DecodeBinaries, path)
+    if actual != expected:
+        raise AssertionError(f"{path}: decoded obstacles differ from the reference decoder")
+    print(f"{path}: {len(actual)} obstacles, {os.path.getsize(path)} bytes, "
+          f"reference {reference:.3f}s, current {current:.3f}s, speedup x{reference / current:.1f}")
+
+def main(args):
+    if args and not args[0].isdigit():
+        for path in args:
+            compare(path)
+        return
+    count = int(args[0]) if args else 20000
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "Synthetic.thing_bin")
+        with open(path, "wb") as file:
+            file.write(mapper.EncodeBinaries(synthetic.obstacles(count)))
+        compare(path)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,34 @@
+# Compare mapper.EncodeBinaries with the quadratic reference encoder
+# usage: python -m benchmarks.mapper_encode [obstacle count | .thing_bin files...]
+
+import io
+import sys
+
+import mapper
+
+from benchmarks.timing import timed
+from benchmarks import legacy_mapper
+from benchmarks import synthetic
+
+def compare(name, obstacles):
+    expected, reference = timed(legacy_mapper.EncodeBinaries, obstacles)
+    actual, current = timed(mapper.EncodeBinaries, obstacles)
+    if actual != expected:
+        raise AssertionError(f"{name}: encoded binaries differ from the reference encoder")
+    stream = io.BytesIO()
+    streamed = timed(mapper.EncodeBinariesTo, stream, obstacles)[1]
+    if stream.getvalue() != expected:
+        raise AssertionError(f"{name}: streamed binaries differ from the reference encoder")
+    print(f"{name}: {len(obstacles)} obstacles, {len(actual)} bytes, "
+          f"reference {reference:.3f}s, current {current:.3f}s, streamed {streamed:.3f}s, speedup x{reference / current:.1f}")
+
+def main(args):
+    if args and not args[0].isdigit():
+        for path in args:
+            compare(path, mapper.DecodeBinaries(path))
+        return
+    count = int(args[0]) if args else 2000
+    compare("synthetic", synthetic.obstacles(count))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
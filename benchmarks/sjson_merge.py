@@ -0,0 +1,82 @@
+# Compare merging SJSON mods into a base file parsed once with the reference
+# merge, which read, mapped and wrote the whole base file for every mod
+# usage: python -m benchmarks.sjson_merge [weapon count [mod count]]
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import modimporter
+
+from benchmarks.timing import timed
+from benchmarks import gametree
+from benchmarks import legacy_sjson
+
+#one _search mapping applied to two elements, then a mod editing only one of them
+CASES = {
+    "shared search mapping": (
+        "L = [\n  { a = 1 }\n  { a = 1 }\n]\n",
+        ['L = [ "_search", [\n  { a = 1 },\n  { _replace = true a = 1 c = { x = 1 } }\n] ]\n',
+         'L = { _sequence = true "1" = { c = { x = 2 } } }\n']),
+}
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
+
+def reference(base, mapfiles):
+    for mapfile in mapfiles:
+        legacy_sjson.mergesjson(base, mapfile)
+
+def current(base, mapfiles):
+    doc = modimporter.document(base, modimporter.mode_sjson)
+    for mapfile in mapfiles:
+        doc.merge(mapfile)
+    doc.write()
+
+def synthetic(weapons, mods, seed=0):
+    rng = random.Random(seed)
+    texts = []
+    for i in range(mods):
+        #Damage matches many weapons, they are all given the same Extra table
+        texts.append(f'Weapons = [ "_search", [\n'
+                     f'  {{ Damage = {rng.randrange(97)} }},\n  {{ Extra = {{ Mod = {i} }} }},\n'
+                     f'  {{ Name = "Weapon{rng.randrange(weapons)}" }},\n  {{ Extra = {{ Mod = "Edited{i}" }} }}\n] ]\n'
+                     f'Other = {{\n  Key{i} = "_delete"\n  Mod{i} = [ "_append", 1, 2 ]\n}}\n')
+    return gametree.sjsontext(weapons, mods), texts
+
+def compare(name, text, modtexts, folder):
+    expected = os.path.join(folder, "expected.sjson")
+    actual = os.path.join(folder, "actual.sjson")
+    write(expected, text)
+    write(actual, text)
+    mapfiles = []
+    for i, modtext in enumerate(modtexts):
+        mapfiles.append(os.path.join(folder, f"mod{i}.sjson"))
+        write(mapfiles[-1], modtext)
+    reference_seconds = timed(reference, expected, mapfiles)[1]
+    current_seconds = timed(current, actual, mapfiles)[1]
+    with open(expected, "rb") as file:
+        expectedbytes = file.read()
+    with open(actual, "rb") as file:
+        if file.read() != expectedbytes:
+            shutil.copyfile(actual, name + ".actual.sjson")
+            shutil.copyfile(expected, name + ".expected.sjson")
+            raise AssertionError(f"{name}: merged output differs from the reference, see {name}.actual/.expected.sjson")
+    print(f"{name}: {len(mapfiles)} mods, {len(expectedbytes)} bytes identical, "
+          f"reference {reference_seconds:.3f}s, current {current_seconds:.3f}s, "
+          f"speedup x{reference_seconds / max(current_seconds, 1e-9):.1f}")
+
+def main(args):
+    weapons = int(args[0]) if args else 5000
+    mods = int(args[1]) if len(args) > 1 else 20
+    with tempfile.TemporaryDirectory() as folder:
+        for name, (text, modtexts) in CASES.items():
+            compare(name, text, modtexts, folder)
+        text, modtexts = synthetic(weapons, mods)
+        compare(f"Synthetic {weapons} weapons", text, modtexts, folder)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,83 @@
+# Compare writing SJSON with sjson.dumps and with sjson.dump through modimporter.writesjson,
+# each in its own process so the peak RSS of one does not hide the other
+# usage: python -m benchmarks.sjson_write [weapon count | .sjson files...]
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import sjson
+
+from benchmarks import gametree
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def maxrss():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on linux, bytes on macos
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def child(method, source, target):
+    import modimporter
+    with open(source, "rb") as file:
+        content = pickle.load(file)
+    before = maxrss()
+    start = time.perf_counter()
+    if method == "dumps":
+        with open(target, "w", encoding="utf-8") as file:
+            file.write(sjson.dumps(content, 2))
+    else:
+        modimporter.writesjson(target, content)
+    seconds = time.perf_counter() - start
+    after = maxrss()
+    print(json.dumps({"seconds": seconds, "rss": after - before if before is not None else None}))
+
+def measure(method, source, target):
+    result = subprocess.run([sys.executable, "-m", "benchmarks.sjson_write", "--child", method, source, target],
+                            check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+def megabytes(rss):
+    return "n/a" if rss is None else f"{rss / (1 << 20):.1f} MB"
+
+def compare(name, content, folder):
+    source = os.path.join(folder, "content.pickle")
+    with open(source, "wb") as file:
+        pickle.dump(content, file, pickle.HIGHEST_PROTOCOL)
+    reference = measure("dumps", source, os.path.join(folder, "dumps.sjson"))
+    current = measure("writer", source, os.path.join(folder, "writer.sjson"))
+    with open(os.path.join(folder, "dumps.sjson"), "rb") as file:
+        expected = file.read()
+    with open(os.path.join(folder, "writer.sjson"), "rb") as file:
+        actual = file.read()
+    if actual != expected:
+        raise AssertionError(f"{name}: streamed output differs from sjson.dumps")
+    print(f"{name}: {len(expected)} bytes, "
+          f"dumps {reference['seconds']:.3f}s peak RSS +{megabytes(reference['rss'])}, "
+          f"streaming {current['seconds']:.3f}s peak RSS +{megabytes(current['rss'])}, "
+          f"speedup x{reference['seconds'] / current['seconds']:.1f}")
+
+def main(args):
+    if args[:1] == ["--child"]:
+        child(*args[1:4])
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        if args and not args[0].isdigit():
+            for path in args:
+                with open(path, "r", encoding="utf-8-sig") as file:
+                    compare(path, sjson.loads(file.read()), folder)
+            return
+        count = int(args[0]) if args else 50000
+        compare(f"Synthetic {count} weapons", sjson.loads(gametree.sjsontext(count, 100)), folder)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,117 @@
+# Time discovery, cleanup, every makeedit mode and the mapper codec on a
+# synthetic game folder, results are written as JSON to track regressions
+# usage: python -m benchmarks.suite [--mods N] [--repeat N] [--output results.json]
+
+import argparse
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from collections import defaultdict
+
+import mapper
+
+from benchmarks.timing import timed
+from benchmarks import gametree
+
+def modenames(modimporter):
+    return {modimporter.mode_lua: "lua", modimporter.mode_lua_alt: "lua",
+            modimporter.mode_xml: "xml", modimporter.mode_sjson: "sjson",
+            modimporter.mode_replace: "replace", modimporter.mode_csv: "csv",
+            modimporter.mode_map: "map"}
+
+def run(modimporter, generate, repeat):
+    names = modenames(modimporter)
+    runs = defaultdict(list)
+    counts = {}
+    for r in range(repeat):
+        #edits and backups of the last repeat would change the workload
+        if r:
+            generate()
+        plan, seconds = timed(modimporter.discover)
+        runs["discovery"].append(seconds)
+        plan, seconds = timed(modimporter.discover)
+        runs["discovery_cached"].append(seconds)
+        modimporter.writeplanlock(plan)
+        plan, seconds = timed(modimporter.readplanlock)
+        runs["plan_lock"].append(seconds)
+
+        edits = defaultdict(float)
+        for base, mods in plan.items():
+            avoided, seconds = timed(modimporter.makeedit, base, mods, echo=False)
+            edits["makeedit_" + names[mods[0].mode]] += seconds
+        for name, seconds in edits.items():
+            runs[name].append(seconds)
+        runs["makeedit"].append(sum(edits.values()))
+        counts = {"bases": len(plan), "mods": sum(map(len, plan.values()))}
+
+        result, seconds = timed(modimporter.cleanup, echo=False)
+        runs["cleanup"].append(seconds)
+
+        obstacles, seconds = timed(mapper.DecodeBinaries, "Maps/Room.thing_bin")
+        runs["mapper_decode"].append(seconds)
+        result, seconds = timed(mapper.EncodeBinaries, obstacles)
+        runs["mapper_encode"].append(seconds)
+    results = {name: {"best": min(seconds), "mean": sum(seconds) / len(seconds), "runs": seconds}
+               for name, seconds in runs.items()}
+    return results, counts
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Mod Importer benchmark suite")
+    parser.add_argument('--mods', type=int, default=50, help="number of synthetic mods (default: 50)")
+    parser.add_argument('--units', type=int, default=20000, help="XML units in the base data file (default: 20000)")
+    parser.add_argument('--weapons', type=int, default=5000, help="SJSON weapons in the base data file (default: 5000)")
+    parser.add_argument('--rows', type=int, default=20000, help="CSV rows in the base table (default: 20000)")
+    parser.add_argument('--obstacles', type=int, default=20000, help="obstacles in the base map (default: 20000)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per measurement (default: 3)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', help="write the JSON results here instead of stdout")
+    options = parser.parse_args(args)
+
+    cwd = os.getcwd()
+    sjson = importlib.util.find_spec("sjson") is not None
+    with tempfile.TemporaryDirectory() as folder:
+        def generate():
+            #the same tree at the same path, modimporter keeps the game path it was imported with
+            os.chdir(cwd)
+            shutil.rmtree(os.path.join(folder, "Hades"), ignore_errors=True)
+            content, seconds = timed(gametree.build, folder, options.mods, options.units, options.weapons,
+                                     options.rows, options.obstacles, options.seed, sjson)
+            os.chdir(content)
+            return seconds
+
+        seconds = generate()
+        try:
+            #modimporter locates the game from the working directory when imported
+            modimporter = importlib.import_module("modimporter")
+            modimporter.LOGGER.setLevel(logging.ERROR)
+            results, counts = run(modimporter, generate, options.repeat)
+        finally:
+            logging.shutdown()
+            os.chdir(cwd)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": vars(options),
+        "sjson": sjson,
+        "generate": seconds,
+        "counts": counts,
+        "results": results,
+    }
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=1)
+        for name, result in results.items():
+            print(f"{name}: best {result['best']:.3f}s, mean {result['mean']:.3f}s")
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,87 @@
+# Synthetic game data for the benchmarks
+
+import random
+
+from mapper import DATA_TYPES
+
+def tribool(rng):
+    return rng.choice((True, False, None))
+
+def single(rng):
+    #a value exactly representable as a 32 bit float
+    return rng.randint(-8192, 8192) / 8.0
+
+def text(rng, prefix):
+    return prefix + str(rng.randint(0, 1 << 20))
+
+#build obstacles in the layout mapper.DecodeBinaries returns
+def obstacles(count, seed=0):
+    rng = random.Random(seed)
+    result = []
+    for i in range(count):
+        result.append({
+            "ActivateAtRange": rng.random() < 0.5,
+            "ActivationRange": single(rng),
+            "Active": rng.random() < 0.5,
+            "AllowMovementReaction": rng.random() < 0.5,
+            "Ambient": single(rng),
+            "Angle": single(rng),
+            "AttachedIDs": [rng.randint(-1, 1 << 20) for x in range(rng.randint(0, 3))],
+            "AttachToID": rng.randint(0, 1 << 20),
+            "CausesOcculsion": rng.random() < 0.5,
+            "Clutter": rng.random() < 0.5,
+            "Collision": rng.random() < 0.5,
+            "Color": {"R": rng.randint(0, 255), "G": rng.randint(0, 255), "B": rng.randint(0, 255), "A": rng.randint(0, 255)},
+            "Comments": text(rng, "Comment") if rng.random() < 0.2 else None,
+            "CreatesShadows": tribool(rng),
+            "DataType": rng.choice(DATA_TYPES),
+            "DrawVfxOnTop": tribool(rng),
+            "FlipHorizontal": rng.random() < 0.5,
+            "FlipVertical": rng.random() < 0.5,
+            "GroupNames": [text(rng, "Group") if rng.random() < 0.8 else "" for x in range(rng.randint(0, 3))],
+            "HelpTextID": text(rng, "Help") if rng.random() < 0.3 else None,
+            "Hue": single(rng),
+            "Saturation": single(rng),
+            "Value": single(rng),
+            "Id": 500000 + i,
+            "IgnoreGridManager": rng.random() < 0.5,
+            "Invert": rng.random() < 0.5,
+            "Location": {"X": single(rng), "Y": single(rng)},
+            "Name": text(rng, "Obstacle") if rng.random() < 0.9 else None,
+            "OffsetZ": single(rng),
+            "ParallaxAmount": single(rng),
+            "Points": [{"X": single(rng), "Y": single(rng)} for x in range(rng.choice((0, 0, 4)))],
+            "Scale": single(rng),
+            "SkewAngle": single(rng),
+            "SkewScale": single(rng),
+            "SortIndex": rng.randint(0, 1 << 16),
+            "StopsLight": tribool(rng),
+            "Tallness": single(rng),
+            "UseBoundsForSortArea": tribool(rng),
+        })
+    return result
+
+#build a large XML document in the style of the game's data files
+def xmltext(count, seed=0):
+    rng = random.Random(seed)
+    lines = ['<?xml version="1.0" encoding="utf-8"?>', '<Game>']
+    for i in range(count):
+        name = text(rng, "Unit")
+        attributes = f'Name="{name}" Health="{rng.randint(1, 500)}" Speed="{single(rng)}"'
+        if rng.random() < 0.2:
+            attributes += f' Description="A unit with {rng.randint(2, 9)} spaces in it"'
+        if rng.random() < 0.1:
+            lines.append(f'  <!-- {name} -->')
+        children = rng.randint(0, 3)
+        if not children:
+            lines.append(f'  <Unit {attributes} />')
+            continue
+        lines.append(f'  <Unit {attributes}>')
+        for x in range(children):
+            if rng.random() < 0.1:
+                lines.append('    <Text>Some "quoted" text &amp; more</Text>')
+            else:
+                lines.append(f'    <Weapon Name="{text(rng, "Weapon")}" Damage="{rng.randint(1, 99)}"/>')
+        lines.append('  </Unit>')
+    lines.append('</Game>')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,8 @@
+# Timing helper shared by the benchmarks
+
+import time
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
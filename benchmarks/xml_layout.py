@@ -0,0 +1,58 @@
+# Compare the streaming XML indentation styling with the reference one
+# usage: python -m benchmarks.xml_layout [unit count | .xml files or folders...]
+# folders are searched recursively, e.g. the game's Content/Game folder
+
+import os
+import shutil
+import sys
+import tempfile
+
+import modimporter
+
+from benchmarks.timing import timed
+from benchmarks import legacy_xml
+from benchmarks import synthetic
+
+def compare(path, folder):
+    start = modimporter.xmlstart(path)
+    tree = modimporter.readxml(path)
+    if tree is modimporter.DNE:
+        print(f"{path}: not valid XML, skipped")
+        return
+    expected = os.path.join(folder, "expected.xml")
+    actual = os.path.join(folder, "actual.xml")
+    reference = timed(legacy_xml.writexml, expected, tree, start)[1]
+    current = timed(modimporter.writexml, actual, tree, start)[1]
+    with open(expected, "rb") as file:
+        expectedbytes = file.read()
+    with open(actual, "rb") as file:
+        if file.read() != expectedbytes:
+            shutil.copyfile(actual, path + ".actual")
+            shutil.copyfile(expected, path + ".expected")
+            raise AssertionError(f"{path}: output differs from the reference styling, see {path}.actual/.expected")
+    print(f"{path}: {len(expectedbytes)} bytes identical, "
+          f"reference {reference:.3f}s, current {current:.3f}s, speedup x{reference / current:.1f}")
+
+def corpus(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, folders, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(".xml"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def main(args):
+    with tempfile.TemporaryDirectory() as folder:
+        if args and not args[0].isdigit():
+            for path in corpus(args):
+                compare(path, folder)
+            return
+        path = os.path.join(folder, "Synthetic.xml")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(synthetic.xmltext(int(args[0]) if args else 20000))
+        compare(path, folder)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
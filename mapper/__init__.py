@@ -1,3 +1,4 @@
+import io
 import json
 import struct
 
@@ -45,15 +46,11 @@ def ReadColor():
 
     return newColor
 
-#read a string which consists of a 4 byte uint length before the characters then the number of characters given by the length bytes
+#read a string which consists of a 4 byte uint length before the characters then the number of utf-8 bytes given by the length bytes
 def ReadString():
-    newString = ""
-
     stringLength = int.from_bytes(f.read(4), "little", signed=False)
-    for i in range(stringLength):
-        newString = newString + f.read(1).decode('utf-8')
 
-    return newString 
+    return f.read(stringLength).decode('utf-8')
 
 #read a string with a bool flag before it, where if the flag is false it is a null string
 def ReadStringAllowNull():
@@ -110,28 +107,9 @@ def WriteTriBoolean(value):
 
     return bytes(binaryBytes)
 
-#write a float using struct
+#write a float using struct, empty floats (including -0.0) are all null bytes
 def WriteSingle(inp):
-    if inp != 0:
-        binaryRep =''.join('{:0>8b}'.format(c) for c in struct.pack('!f', inp))
-        #store binary as 2 chunks of 16
-        sections = ["",""]
-        for i in range(8, 33, 8):
-            byte = binaryRep[i-8:i]
-            sections[(i - 1) // 16] += byte
-
-        ret = b""
-        #f.write(chr(int(bytes[1][0:8], 2))) #1,2
-        #write in order of D C B A
-        for section in reversed(sections):
-            sectionBytes = [int(section[8:16], 2), int(section[0:8], 2)]
-            ret = ret + bytes(sectionBytes)
-
-        return ret
-    else:
-        #Empty float print all null bytes
-        emptyBytes = [0, 0, 0, 0]
-        return bytes(emptyBytes)
+    return SINGLE_STRUCT.pack(PackableSingle(inp))
 
 #collect R,G,B, and A and write them into the binary
 def WriteColor(colorTable):
@@ -142,16 +120,11 @@ def WriteColor(colorTable):
     colorBytes = [r, g, b, a]
     return bytes(colorBytes)
     
-#write a string
+#write a string, its utf-8 byte length then its bytes
 def WriteString(string):
-    #add length of string to array
-    bR = len(string).to_bytes(4, byteorder='big')
-    stringBytes = [bR[3], bR[2], bR[1], bR[0]]
-    #add each character to array to be converted
-    for c in string:
-        stringBytes.append(ord(c))
-    #write converting each into bytes representation
-    return bytes(stringBytes)
+    stringBytes = string.encode('utf-8')
+
+    return UINT32_STRUCT.pack(len(stringBytes)) + stringBytes
 
 #write a string that has a bool flag before it to show if the string is null or not
 def WriteStringAllowNull(string):
@@ -170,173 +143,240 @@ def WriteDataType(type):
     return bytes(dataTypeBytes)
 
 
-#read a binary file and write it to JSON
-def DecodeBinaries(inputFilePath):
-    global f
-    f =  open(inputFilePath, "rb")
-    f.read(4) #read SGB1, whatever it is
-    f.read(4) #always going be 12, put need to read it to get it out of the way
-    obstacleCount = ReadUInt32()
-    obstacleTable = {"Obstacles": []}
-    for i in range(obstacleCount):
-        ReadBoolean() #read do create flag
-        newObstacle = {}
-        newObstacle["ActivateAtRange"] = ReadBoolean()
-        newObstacle["ActivationRange"] = ReadSingle()
-        newObstacle["Active"] = ReadBoolean()
-        newObstacle["AllowMovementReaction"] = ReadBoolean()
-        newObstacle["Ambient"] = ReadSingle()
-        newObstacle["Angle"] = ReadSingle()
-        
-        newObstacle["AttachedIDs"] = []
-        attachedIdLength = ReadInt32()
-        for x in range(attachedIdLength):
-           newObstacle["AttachedIDs"].append(ReadInt32())
-        
-        newObstacle["AttachToID"] = ReadInt32()
-        newObstacle["CausesOcculsion"] = ReadBoolean()
-        newObstacle["Clutter"] = ReadBoolean()
-        newObstacle["Collision"] = ReadBoolean()
-        
-        newObstacle["Color"] = ReadColor()
-        newObstacle["Comments"] = ReadStringAllowNull()
-        
-        newObstacle["CreatesShadows"] = ReadTriBoolean()
-        newObstacle["DataType"] = ReadDataType()
-        newObstacle["DrawVfxOnTop"] = ReadTriBoolean()
-
-        newObstacle["FlipHorizontal"] = ReadBoolean()
-        newObstacle["FlipVertical"] = ReadBoolean()
-
-        newObstacle["GroupNames"] = []
-        groupNamesLength = ReadInt32()
-        for x in range(groupNamesLength):
-            ReadSingle() #for whatever reason the engine reads 4 bytes and just ... does nothing with them
-            isStringNull = ReadBoolean()
-            if not isStringNull:
-                newObstacle["GroupNames"].append("")
-            else:
-                newObstacle["GroupNames"].append(ReadString())
-        
-        newObstacle["HelpTextID"] = ReadStringAllowNull()
-        newObstacle["Hue"] = ReadSingle()
-        newObstacle["Saturation"] = ReadSingle()
-        newObstacle["Value"] = ReadSingle()
-        newObstacle["Id"] = ReadInt32()
-        newObstacle["IgnoreGridManager"] = ReadBoolean()
-        newObstacle["Invert"] = ReadBoolean()
-
-        newObstacle["Location"] = {"X": ReadSingle(), "Y": ReadSingle()}
-
-        newObstacle["Name"] = ReadStringAllowNull()
-
-        newObstacle["OffsetZ"] = ReadSingle()
-        newObstacle["ParallaxAmount"] = ReadSingle()
-
-        newObstacle["Points"] = []
-        pointsLength = ReadInt32()
-        for x in range(pointsLength):
-            newObstacle["Points"].append({"X": ReadSingle(), "Y": ReadSingle()})
-        
-        newObstacle["Scale"] = ReadSingle()
-        newObstacle["SkewAngle"] = ReadSingle()
-        newObstacle["SkewScale"] = ReadSingle()
-        newObstacle["SortIndex"] = ReadInt32()
-        newObstacle["StopsLight"] = ReadTriBoolean()
-        newObstacle["Tallness"] = ReadSingle()
-        newObstacle["UseBoundsForSortArea"] = ReadTriBoolean()
-
-        obstacleTable["Obstacles"].append(newObstacle)
-
-    f.close()
-
-    return obstacleTable["Obstacles"]
-
-    # jsonString = json.dumps(obstacleTable, sort_keys=True, indent=4)
-    # with open(outputFilePath, "w+") as oid:
-    #     oid.write(jsonString)
-
-#read a json file and write it to binaries
-def EncodeBinaries(data):
-    obstacles = data
-
-    binary_data = b""
-
-    binary_data = binary_data + b"SGB1" #write whatever this is
-    binary_data = binary_data + WriteInt32(12) #write the version number, this is always 12
-    binary_data = binary_data + WriteInt32(len(obstacles))
-
-    for item in obstacles:
-        binary_data = binary_data + WriteBoolean(True)
-
-        binary_data = binary_data + WriteBoolean(item["ActivateAtRange"])
-        binary_data = binary_data + WriteSingle(item["ActivationRange"])
-        binary_data = binary_data + WriteBoolean(item["Active"])
+#precompiled layouts of the fixed size runs of an obstacle, in file order
+#tri booleans and data types are 4 bytes of which only the first one is used
+HEADER_STRUCT = struct.Struct("<4sII") #SGB1, version (always 12), obstacle count
+OBSTACLE_START_STRUCT = struct.Struct("<??f??ffi") #do create flag up to AttachedIDs length
+ATTACHED_STRUCT = struct.Struct("<i???4B") #AttachToID up to Color
+FLAGS_STRUCT = struct.Struct("<B3xB3xB3x??i") #CreatesShadows up to GroupNames length
+GROUP_STRUCT = struct.Struct("<4x?") #unused 4 bytes and string null flag
+COLOR_STRUCT = struct.Struct("<fffi??ff") #Hue up to Location
+OFFSET_STRUCT = struct.Struct("<ffi") #OffsetZ up to Points length
+POINT_STRUCT = struct.Struct("<ff")
+OBSTACLE_END_STRUCT = struct.Struct("<fffiB3xfB3x") #Scale up to UseBoundsForSortArea
+UINT32_STRUCT = struct.Struct("<I")
+SINGLE_STRUCT = struct.Struct("<f")
+BOOL_STRUCT = struct.Struct("<?")
+
+#map the first byte of a tri boolean, see ReadTriBoolean
+TRI_BOOLEANS = {0: True, 2: False}
+
+#unpack a string from a buffer at offset, returns the string and the offset after it
+def UnpackString(buffer, offset):
+    stringLength = UINT32_STRUCT.unpack_from(buffer, offset)[0]
+    offset += UINT32_STRUCT.size
+
+    return str(buffer[offset:offset + stringLength], "utf-8"), offset + stringLength
+
+#unpack a string with a bool flag before it, where if the flag is false it is a null string
+def UnpackStringAllowNull(buffer, offset):
+    doReadString = BOOL_STRUCT.unpack_from(buffer, offset)[0]
+    offset += BOOL_STRUCT.size
 
-        binary_data = binary_data + WriteBoolean(item["AllowMovementReaction"])
-        binary_data = binary_data + WriteSingle(item["Ambient"])
-        binary_data = binary_data + WriteSingle(item["Angle"])
+    if doReadString:
+        return UnpackString(buffer, offset)
+    return None, offset
 
-        binary_data = binary_data + WriteInt32(len(item["AttachedIDs"]))
-       
-        for attachedID in item["AttachedIDs"]:
-            binary_data = binary_data + WriteInt32(attachedID)
-        binary_data = binary_data + WriteInt32(item["AttachToID"])
+#raise the struct.error truncated or corrupt data gives everywhere else for a negative count
+def CheckLength(length, field, offset):
+    if length < 0:
+        raise struct.error("negative %s length %d at offset %d" % (field, length, offset))
 
-        binary_data = binary_data + WriteBoolean(item["CausesOcculsion"])
-        binary_data = binary_data + WriteBoolean(item["Clutter"])
-        binary_data = binary_data + WriteBoolean(item["Collision"])
+#read a binary file and write it to JSON
+#the file is loaded once and the fixed size runs of each obstacle are unpacked in one call each
+def DecodeBinaries(inputFilePath):
+    with open(inputFilePath, "rb") as inputFile:
+        buffer = memoryview(inputFile.read())
 
-        binary_data = binary_data + WriteColor(item["Color"])
+    #SGB1 and the version are not used
+    obstacleCount = HEADER_STRUCT.unpack_from(buffer, 0)[2]
+    offset = HEADER_STRUCT.size
 
-        binary_data = binary_data + WriteStringAllowNull(item["Comments"])
+    obstacles = []
+    for i in range(obstacleCount):
+        (_, activateAtRange, activationRange, active, allowMovementReaction, ambient, angle,
+         attachedIdLength) = OBSTACLE_START_STRUCT.unpack_from(buffer, offset)
+        offset += OBSTACLE_START_STRUCT.size
 
-        binary_data = binary_data + WriteTriBoolean(item["CreatesShadows"])
-        binary_data = binary_data + WriteDataType(item["DataType"])
-        binary_data = binary_data + WriteTriBoolean(item["DrawVfxOnTop"])
-        
-        binary_data = binary_data + WriteBoolean(item["FlipHorizontal"])
-        binary_data = binary_data + WriteBoolean(item["FlipVertical"])
+        CheckLength(attachedIdLength, "AttachedIDs", offset)
+        attachedIds = list(struct.unpack_from("<%di" % attachedIdLength, buffer, offset))
+        offset += 4 * attachedIdLength
 
-        binary_data = binary_data + WriteInt32(len(item["GroupNames"]))  
-        for group in item["GroupNames"]:
-            binary_data = binary_data + b'\x00\x00\x00\x00'
-            binary_data = binary_data + WriteStringAllowNull(group)  
-        
-        binary_data = binary_data + WriteStringAllowNull(item["HelpTextID"])
-        
-        binary_data = binary_data + WriteSingle(item["Hue"])
-        binary_data = binary_data + WriteSingle(item["Saturation"])
-        binary_data = binary_data + WriteSingle(item["Value"])
+        attachToId, causesOcculsion, clutter, collision, r, g, b, a = ATTACHED_STRUCT.unpack_from(buffer, offset)
+        offset += ATTACHED_STRUCT.size
 
-        binary_data = binary_data + WriteInt32(item["Id"])
+        comments, offset = UnpackStringAllowNull(buffer, offset)
 
-        binary_data = binary_data + WriteBoolean(item["IgnoreGridManager"])
-        binary_data = binary_data + WriteBoolean(item["Invert"])
+        (createsShadows, dataType, drawVfxOnTop, flipHorizontal, flipVertical,
+         groupNamesLength) = FLAGS_STRUCT.unpack_from(buffer, offset)
+        offset += FLAGS_STRUCT.size
 
-        binary_data = binary_data + WriteSingle(item["Location"]["X"])
-        binary_data = binary_data + WriteSingle(item["Location"]["Y"])
+        groupNames = []
+        for x in range(groupNamesLength):
+            isStringNull = GROUP_STRUCT.unpack_from(buffer, offset)[0]
+            offset += GROUP_STRUCT.size
+            if not isStringNull:
+                groupNames.append("")
+            else:
+                groupName, offset = UnpackString(buffer, offset)
+                groupNames.append(groupName)
+
+        helpTextId, offset = UnpackStringAllowNull(buffer, offset)
+
+        hue, saturation, value, id, ignoreGridManager, invert, x, y = COLOR_STRUCT.unpack_from(buffer, offset)
+        offset += COLOR_STRUCT.size
+
+        name, offset = UnpackStringAllowNull(buffer, offset)
+
+        offsetZ, parallaxAmount, pointsLength = OFFSET_STRUCT.unpack_from(buffer, offset)
+        offset += OFFSET_STRUCT.size
+
+        CheckLength(pointsLength, "Points", offset)
+        points = struct.unpack_from("<%df" % (2 * pointsLength), buffer, offset)
+        offset += 8 * pointsLength
+
+        (scale, skewAngle, skewScale, sortIndex, stopsLight, tallness,
+         useBoundsForSortArea) = OBSTACLE_END_STRUCT.unpack_from(buffer, offset)
+        offset += OBSTACLE_END_STRUCT.size
+
+        #same keys in the same order as the field by field readers produced
+        obstacles.append({
+            "ActivateAtRange": activateAtRange,
+            "ActivationRange": activationRange,
+            "Active": active,
+            "AllowMovementReaction": allowMovementReaction,
+            "Ambient": ambient,
+            "Angle": angle,
+            "AttachedIDs": attachedIds,
+            "AttachToID": attachToId,
+            "CausesOcculsion": causesOcculsion,
+            "Clutter": clutter,
+            "Collision": collision,
+            "Color": {"R" : r, "G" : g, "B" : b, "A" : a},
+            "Comments": comments,
+            "CreatesShadows": TRI_BOOLEANS.get(createsShadows),
+            "DataType": DATA_TYPES[dataType],
+            "DrawVfxOnTop": TRI_BOOLEANS.get(drawVfxOnTop),
+            "FlipHorizontal": flipHorizontal,
+            "FlipVertical": flipVertical,
+            "GroupNames": groupNames,
+            "HelpTextID": helpTextId,
+            "Hue": hue,
+            "Saturation": saturation,
+            "Value": value,
+            "Id": id,
+            "IgnoreGridManager": ignoreGridManager,
+            "Invert": invert,
+            "Location": {"X": x, "Y": y},
+            "Name": name,
+            "OffsetZ": offsetZ,
+            "ParallaxAmount": parallaxAmount,
+            "Points": [{"X": points[p], "Y": points[p + 1]} for p in range(0, len(points), 2)],
+            "Scale": scale,
+            "SkewAngle": skewAngle,
+            "SkewScale": skewScale,
+            "SortIndex": sortIndex,
+            "StopsLight": TRI_BOOLEANS.get(stopsLight),
+            "Tallness": tallness,
+            "UseBoundsForSortArea": TRI_BOOLEANS.get(useBoundsForSortArea),
+        })
+
+    return obstacles
+
+#32 bit int fields were written unsigned, keep accepting values up to 2^32 - 1
+def PackableInt32(number):
+    if number > 0x7FFFFFFF:
+        return number - 0x100000000
+    return number
+
+#empty floats (including -0.0) are written as all null bytes, see WriteSingle
+def PackableSingle(number):
+    if number == 0:
+        return 0.0
+    return number
+
+#first byte of a tri boolean, see WriteTriBoolean
+def TriBooleanByte(value):
+    if value == True:
+        return 0
+    elif value == False:
+        return 2
+    return 1
 
-        binary_data = binary_data + WriteStringAllowNull(item["Name"])
+#stream the binaries of a list of obstacles to a file object opened in binary mode
+#each fixed size run of an obstacle is packed with one precompiled struct call
+def EncodeBinariesTo(outputFile, obstacles):
+    write = outputFile.write
 
-        binary_data = binary_data + WriteSingle(item["OffsetZ"])
-        binary_data = binary_data + WriteSingle(item["ParallaxAmount"])
+    write(HEADER_STRUCT.pack(b"SGB1", 12, len(obstacles))) #write whatever this is and the version number, this is always 12
 
-        binary_data = binary_data + WriteInt32(len(item["Points"]))
+    for item in obstacles:
+        write(OBSTACLE_START_STRUCT.pack(
+            True,
+            item["ActivateAtRange"] == True,
+            PackableSingle(item["ActivationRange"]),
+            item["Active"] == True,
+            item["AllowMovementReaction"] == True,
+            PackableSingle(item["Ambient"]),
+            PackableSingle(item["Angle"]),
+            len(item["AttachedIDs"])))
+        write(struct.pack("<%di" % len(item["AttachedIDs"]), *map(PackableInt32, item["AttachedIDs"])))
+
+        color = item["Color"]
+        write(ATTACHED_STRUCT.pack(
+            PackableInt32(item["AttachToID"]),
+            item["CausesOcculsion"] == True,
+            item["Clutter"] == True,
+            item["Collision"] == True,
+            color["R"], color["G"], color["B"], color["A"]))
+
+        write(WriteStringAllowNull(item["Comments"]))
+
+        write(FLAGS_STRUCT.pack(
+            TriBooleanByte(item["CreatesShadows"]),
+            DATA_TYPES.index(item["DataType"]),
+            TriBooleanByte(item["DrawVfxOnTop"]),
+            item["FlipHorizontal"] == True,
+            item["FlipVertical"] == True,
+            len(item["GroupNames"])))
+        for group in item["GroupNames"]:
+            write(b'\x00\x00\x00\x00')
+            write(WriteStringAllowNull(group))
+
+        write(WriteStringAllowNull(item["HelpTextID"]))
+
+        location = item["Location"]
+        write(COLOR_STRUCT.pack(
+            PackableSingle(item["Hue"]),
+            PackableSingle(item["Saturation"]),
+            PackableSingle(item["Value"]),
+            PackableInt32(item["Id"]),
+            item["IgnoreGridManager"] == True,
+            item["Invert"] == True,
+            PackableSingle(location["X"]),
+            PackableSingle(location["Y"])))
+
+        write(WriteStringAllowNull(item["Name"]))
+
+        write(OFFSET_STRUCT.pack(
+            PackableSingle(item["OffsetZ"]),
+            PackableSingle(item["ParallaxAmount"]),
+            len(item["Points"])))
         for point in item["Points"]:
-            binary_data = binary_data + WriteSingle(point["X"])
-            binary_data = binary_data + WriteSingle(point["Y"])
-        
-        binary_data = binary_data + WriteSingle(item["Scale"])
-        binary_data = binary_data + WriteSingle(item["SkewAngle"])
-        binary_data = binary_data + WriteSingle(item["SkewScale"])
+            write(POINT_STRUCT.pack(PackableSingle(point["X"]), PackableSingle(point["Y"])))
 
-        binary_data = binary_data + WriteInt32(item["SortIndex"])
+        write(OBSTACLE_END_STRUCT.pack(
+            PackableSingle(item["Scale"]),
+            PackableSingle(item["SkewAngle"]),
+            PackableSingle(item["SkewScale"]),
+            PackableInt32(item["SortIndex"]),
+            TriBooleanByte(item["StopsLight"]),
+            PackableSingle(item["Tallness"]),
+            TriBooleanByte(item["UseBoundsForSortArea"])))
 
-        binary_data = binary_data + WriteTriBoolean(item["StopsLight"])
-
-        binary_data = binary_data + WriteSingle(item["Tallness"])
-
-        binary_data = binary_data + WriteTriBoolean(item["UseBoundsForSortArea"])
+#read a json file and write it to binaries
+def EncodeBinaries(data):
+    binary_data = io.BytesIO()
+    EncodeBinariesTo(binary_data, data)
 
-    return binary_data
\ No newline at end of file
+    return binary_data.getvalue()
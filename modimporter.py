@@ -1,34 +1,66 @@
 # Mod Importer for SuperGiant Games' Games
 
 import argparse
+import hashlib
 import logging
+import multiprocessing
+import multiprocessing.spawn
 import os
+import pickle
 import platform
 import sys
+import threading
+import time
+import traceback
 from collections import defaultdict
 from collections import deque
+from bisect import bisect_left
+from bisect import insort
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import logging
 from collections import OrderedDict
 from shutil import copyfile
+from shutil import rmtree
 from datetime import datetime
 
+import codecs
 import csv
+import io
+import re
 import xml.etree.ElementTree as xml
 
 import json
 
 # Logging configuration
-logging.basicConfig(
-    format='%(message)s',
-    handlers=[
-        logging.FileHandler("modimporter.log.txt", mode='w'),
-        logging.StreamHandler(),
-    ],
-)
+# worker processes (--jobs) may re-import this module, they must not truncate
+# the log file, their output is buffered and handed back to the main process
+is_worker = (multiprocessing.parent_process() is not None or __name__ == '__mp_main__'
+             or multiprocessing.spawn.is_forking(sys.argv))
+if not is_worker:
+    logging.basicConfig(
+        format='%(message)s',
+        handlers=[
+            logging.FileHandler("modimporter.log.txt", mode='w'),
+            logging.StreamHandler(),
+        ],
+    )
 LOGGER = logging.getLogger('modimporter')
 LOGGER.setLevel(logging.INFO)
+if is_worker:
+    LOGGER.addHandler(logging.NullHandler())
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+FICLONE = 0x40049409 #linux ioctl cloning a file (reflink) on btrfs, xfs, ...
+try:
+    import psutil #optional, I/O counters for --profile
+except ImportError:
+    psutil = None
 
 can_mapper = False
 try:
@@ -61,6 +93,11 @@ if platform.system() == 'Darwin' and getattr(sys, 'frozen', False) and hasattr(s
 ## Global Settings
 
 clean_only = False #uninstall option, ignores mod folder
+plan_only = False #dry run option, shows the edit plan without touching the game files
+jobs = 1 #number of worker processes used to edit base files
+scanthreads = 8 #number of threads reading modfiles and scanning mod folders
+profiler = None #trace events when run with --profile, else no spans are recorded
+profiletop = 10 #slowest spans listed after a profiled run
 
 game_aliases = {"Resources":"Hades", #alias for temporary mac support
                 "Content":"Hades"}  #alias for temporary windows store support
@@ -71,6 +108,14 @@ gamerel = ".."
 scope = "Content"
 bakdir = "Backup"
 baktype = ""
+statedir = bakdir+"/.state" #persisted install state, ignored by cleanup
+manifestfile = "manifest.json"
+planfile = "plan.json" #resolved load plan, reused while the probed mod paths are unchanged
+mapcachedir = statedir+"/maps" #merged map changes per base map
+parsecachefile = statedir+"/modfiles.pickle" #parsed commands per modfile
+racytick = 2*10**9 #ns, coarsest modification time resolution (FAT) trusted by the caches
+storedir = statedir+"/objects" #pristine originals by content hash, backups link to them
+sjsoncachedir = statedir+"/sjson" #parsed pristine SJSON base files by content hash
 modfile = "modfile.txt"
 mlcom_start = "-:"
 mlcom_end = ":-"
@@ -85,6 +130,7 @@ modified_xml = "<!-- "+modified+" -->"
 modified_sjson = "/* "+modified+" */"
 modified_csv = modified
 modified_map = modified
+markertail = 256 #bytes at the end of a base file searched for the marker
 
 default_to = {"Hades":["Scripts/RoomManager.lua"],
             "Hades II Technical Test":["Scripts/RoomLogic.lua"],
@@ -140,93 +186,169 @@ def safepairs(data):
         it = data.items()
     return it
 
+dneholders = [] #containers sjsonmap put a DNE in since the last compaction
+dnecopy = False #a mapping went to several elements, its lists must not stay shared
+
+def resetDNE():
+    global dnecopy
+    dneholders.clear()
+    dnecopy = False
+
+def compactDNE(data):
+    #removes the DNE entries where sjsonmap put them instead of rebuilding the tree
+    holders = {id(holder):holder for holder in dneholders}
+    copy = dnecopy
+    resetDNE()
+    if copy:
+        #clearDNE rebuilds every container, so none is left shared between elements
+        return clearDNE(data)
+    for holder in holders.values():
+        if isinstance(holder,OrderedDict):
+            for k in [k for k,v in holder.items() if v is DNE]:
+                del holder[k]
+        elif isinstance(holder,list):
+            holder[:] = [v for v in holder if v is not DNE]
+    return data
+
 def clearDNE(data):
+    #a new tree, as writing the file and reading it back would give
     if isinstance(data,OrderedDict):
-        for k,v in data.copy().items():
-            if v is DNE:
-                del data[k]
-                continue
-            data[k] = clearDNE(v)
+        return OrderedDict((k,clearDNE(v)) for k,v in data.items() if v is not DNE)
     if isinstance(data,list):
-        L = []
-        for i,v in enumerate(data):
-            if v is DNE:
-                continue
-            L.append(clearDNE(v))
-        data = L
+        return [clearDNE(v) for v in data if v is not DNE]
     return data
 
 ### LUA import statement adding
 
-def addimport(base,path):
-    with open(base,'a',encoding='utf-8') as basefile:
-        basefile.write("\nImport "+"\""+modsrel+"/"+path+"\"")
-
-def addtopimport(base,path):
-    with open(base,'r+',encoding='utf-8') as basefile:
-        lines = basefile.readlines()     
-        lines.insert(0, "Import "+"\""+modsrel+"/"+path+"\"\n")  
-        basefile.seek(0)                 
-        basefile.truncate()
-        basefile.writelines(lines)
+#all Import and Top Import statements of a base file, written in one pass
+class imports():
+    def __init__(self,filename):
+        self.filename = filename
+        self.modes = {mode_lua,mode_lua_alt}
+        self.top = []
+        self.bottom = []
+
+    def add(self,path,top=False):
+        if top:
+            self.top.append("Import "+"\""+modsrel+"/"+path+"\"\n")
+        else:
+            self.bottom.append("\nImport "+"\""+modsrel+"/"+path+"\"")
+
+    def write(self):
+        if self.top:
+            body = ""
+            if os.path.exists(self.filename):
+                with open(self.filename,'r',encoding='utf-8') as basefile:
+                    body = basefile.read()
+            #a later top import goes above the earlier ones
+            with open(self.filename,'w',encoding='utf-8') as basefile:
+                basefile.write("".join(reversed(self.top))+body+"".join(self.bottom))
+        else:
+            with open(self.filename,'a',encoding='utf-8') as basefile:
+                basefile.write("".join(self.bottom))
+        #number of base file round trips saved
+        return len(self.top)+len(self.bottom)-1
 
 ### CSV mapping
 
-def readcsv(filename):
-    with open(filename,'r',newline='',encoding='utf-8-sig') as file:
-        return list(csv.reader(file))
-    
-
-def writecsv(filename,content):
-    with open(filename,'w',newline='',encoding='utf-8-sig') as file:
-        writer = csv.writer(file,quoting=csv.QUOTE_MINIMAL)
-        for row in content:
-            writer.writerow(row)
-
-def csvmap(indata,mapdata):
-    target = [0,0]
-    current = [0,0]
-    append = False
-    replace = False
-    for row in mapdata:
-        if len(row) == 2 and row[0][0] == '<' and row[-1][-1] == '>':
-            target[0] = int(row[0][1:])
-            target[1] = int(row[-1][:-1])
-            current[0] = target[0]
-            append = False
-            replace = False
-            continue
-        if len(row) == 1 and row[0] == reserved_append:
-            append = True
-            replace = False
-        if len(row) == 1 and row[0] == reserved_replace:
-            append = False
-            replace = True
-        if append:
-            indata.append(row)
-        else:
-            if replace:
-                indata[current[0]]=row
-            else:
-                current[1] = target[1]
-                for value in row:
-                    if value == reserved_delete:
-                        indata[current[0]][current[1]] = ""
-                    elif value != "":
-                        indata[current[0]][current[1]] = value
-                    current[1] += 1
-            current[0] += 1
-    return indata
-            
-
-def mergecsv(infile,mapfile):
-    indata = readcsv(infile)
-    if mapfile:
-        mapdata = readcsv(mapfile)
-    else:
-        mapdata = DNE
-    indata = csvmap(indata,mapdata)
-    writecsv(infile,indata)
+#every CSV mod of a base file compiled into one patch set addressed by row,
+#then the base is streamed through it row by row once
+#a mod row <row,column> moves to that cell, each following row writes its
+#non-empty values from there (_delete empties a cell) one row further down,
+#after a _replace row whole rows are replaced, after an _append row they are
+#added at the end, the marker rows themselves included
+class csvpatch():
+    def __init__(self,filename):
+        self.filename = filename
+        self.modes = {mode_csv}
+        self.rows = defaultdict(list)
+        self.appended = []
+        self.order = 0
+        self.files = 0
+
+    def add(self,mapfile):
+        target = [0,0]
+        current = 0
+        append = False
+        replace = False
+        with open(mapfile,'r',newline='',encoding='utf-8-sig') as file:
+            for row in csv.reader(file):
+                if len(row) == 2 and row[0][:1] == '<' and row[-1][-1:] == '>':
+                    target[0] = int(row[0][1:])
+                    target[1] = int(row[-1][:-1])
+                    current = target[0]
+                    append = False
+                    replace = False
+                    continue
+                if len(row) == 1 and row[0] == reserved_append:
+                    append = True
+                    replace = False
+                if len(row) == 1 and row[0] == reserved_replace:
+                    append = False
+                    replace = True
+                self.order += 1
+                if append:
+                    self.appended.append((self.order,row))
+                    continue
+                if replace or any(row):
+                    self.rows[current].append((self.order,None if replace else target[1],row))
+                current += 1
+        self.files += 1
+
+    def patch(self,i,row,since=0):
+        for order,column,values in self.rows.pop(i,()):
+            if order < since:
+                raise IndexError(f"{self.filename}: CSV row {i} is changed before it is appended")
+            if column is None:
+                row = values
+                continue
+            for value in values:
+                if value == reserved_delete:
+                    row[column] = ""
+                elif value != "":
+                    row[column] = value
+                column += 1
+        return row
+
+    def resolve(self,count):
+        #a negative row counts back from the end of the table as it was when
+        #the change was made, the base rows and the rows appended before it
+        appended = [order for order,row in self.appended]
+        for i in [i for i in self.rows if i < 0]:
+            for change in self.rows.pop(i):
+                j = i+count+bisect_left(appended,change[0])
+                if j < 0:
+                    raise IndexError(f"{self.filename}: CSV row {i} is out of range")
+                insort(self.rows[j],change)
+
+    def write(self):
+        if any(i < 0 for i in self.rows):
+            count = 0
+            if os.path.exists(self.filename):
+                with open(self.filename,'r',newline='',encoding='utf-8-sig') as infile:
+                    count = sum(1 for row in csv.reader(infile))
+            self.resolve(count)
+        temp = self.filename+".tmp"
+        try:
+            with open(temp,'w',newline='',encoding='utf-8-sig') as outfile:
+                writer = csv.writer(outfile,quoting=csv.QUOTE_MINIMAL)
+                i = 0
+                if os.path.exists(self.filename):
+                    with open(self.filename,'r',newline='',encoding='utf-8-sig') as infile:
+                        for row in csv.reader(infile):
+                            writer.writerow(self.patch(i,row))
+                            i += 1
+                for order,row in self.appended:
+                    writer.writerow(self.patch(i,row,order))
+                    i += 1
+            if self.rows:
+                raise IndexError(f"{self.filename}: CSV row {min(self.rows)} is out of range")
+            os.replace(temp,self.filename)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        #number of base file round trips saved
+        return self.files-1
 
 ### XML mapping
 
@@ -236,42 +358,77 @@ def readxml(filename):
     except xml.ParseError:
         return DNE
 
+#runs of characters the indentation styling passes through unchanged, or a single character it acts on
+xmltokens = re.compile(r'[^"</> \t]+|.',re.DOTALL)
+
+#indentation styling of serialized XML, fed as it is serialized and written out once
+#each line is laid out as a sequence of tokens: a character the styling acts on,
+#or a run of characters of which only the first one can start a new line
+class xmllayout():
+    def __init__(self,file,start=None):
+        self.file = file
+        self.out = [start] if start else []
+        self.line = ""
+        self.decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self.newlines = io.IncrementalNewlineDecoder(None,translate=True)
+        self.i = 0
+
+    def write(self,data):
+        lines = (self.line+self.newlines.decode(self.decoder.decode(data))).split("\n")
+        self.line = lines.pop()
+        for line in lines:
+            self.layout(line+"\n")
+        if len(self.out) > 4096:
+            #the last piece may still lose its last character
+            self.file.write("".join(self.out[:-1]))
+            del self.out[:-1]
+        return len(data)
+
+    def close(self):
+        line = self.line+self.newlines.decode(self.decoder.decode(b"",True),True)
+        self.line = ""
+        self.layout(line)
+        self.file.write("".join(self.out))
+        self.out = []
+
+    def layout(self,line):
+        if len(line.replace('\t','').replace(' ','')) <= 1:
+            return
+        i = self.i
+        out = self.out
+        emit = out.append
+        q = True
+        p = ''
+        for token in xmltokens.findall(line):
+            s = token[0]
+            if s == '\"':
+                q = not q
+            if p == '<' and q:
+                if s == '/':
+                    i -= 1
+                    if out:
+                        out[-1] = out[-1][:-1]
+                else:
+                    i += 1
+                emit(p)
+            if s == '>' and p == '/' and q:
+                i -= 1
+            if p in (' ') or (s == '>' and p == '\"') and q:
+                emit('\n'+'\t'*(i-(s=='/')))
+            if s not in (' ','\t','<') or not q:
+                emit(token)
+            p = token[-1]
+        self.i = i
+
 def writexml(filename,content,start=None):
     if not isinstance(filename,str):
         return
     if not isinstance(content, xml.ElementTree):
         return
-    content.write(filename)
-
-    #indentation styling
-    data = ""
-    if start:
-        data = start
-    with open(filename,'r',encoding='utf-8-sig') as file:
-        i = 0
-        for line in file:
-            nl = False
-            if len(line.replace('\t','').replace(' ',''))>1:
-                q=True
-                p=''
-                for s in line:
-                    if s == '\"':
-                        q = not q
-                    if p == '<' and q:
-                        if s == '/':
-                            i-=1
-                            data = data[:-1]
-                        else:
-                            i+=1
-                        data+=p
-                    if s == '>' and p == '/' and q:
-                        i-=1
-                    if p in (' ') or (s=='>' and p == '\"') and q:
-                        data+='\n'+'\t'*(i-(s=='/'))
-                    if s not in (' ','\t','<') or not q:
-                        data+=s
-                    p=s
-    open(filename,'w',encoding='utf-8').write(data)
+    with open(filename,'w',encoding='utf-8') as file:
+        layout = xmllayout(file,start)
+        content.write(layout)
+        layout.close()
 
 def xmlmap(indata,mapdata):
     if mapdata is DNE:
@@ -287,20 +444,24 @@ def xmlmap(indata,mapdata):
                 indata._setroot(root)
             return indata
         elif isinstance(mapdata,xml.Element):
-            mtags = dict()
-            for v in mapdata:
-                if not mtags.get(v.tag,False):
-                    mtags[v.tag]=True
-            for tag in mtags:
-                mes = mapdata.findall(tag)
-                ies = indata.findall(tag)
+            #children by tag, in document order, indexed once per element
+            mtags = defaultdict(list)
+            for me in mapdata:
+                mtags[me.tag].append(me)
+            itags = defaultdict(list)
+            for ie in indata:
+                itags[ie.tag].append(ie)
+            deleted = set()
+            appended = []
+            for tag,mes in mtags.items():
+                ies = itags.get(tag,[])
                 for i,me in enumerate(mes):
                     ie = safeget(ies,i)
                     if ie is DNE:
-                        indata.append(me)
+                        appended.append(me)
                         continue
                     if me.get(reserved_delete,None) not in (None,'0','false','False'):
-                        indata.remove(ie)
+                        deleted.add(id(ie))
                         continue
                     if me.get(reserved_replace,None) not in (None,'0','false','False'):
                         ie.text = me.text
@@ -312,30 +473,28 @@ def xmlmap(indata,mapdata):
                     ie.tail = xmlmap(ie.tail,me.tail)
                     ie.attrib = xmlmap(ie.attrib,me.attrib)
                     xmlmap(ie,me)
+            if deleted or appended:
+                indata[:] = [ie for ie in indata if id(ie) not in deleted]+appended
             return indata
         return mapdata
     else:
         return mapdata
     return mapdata
 
-def mergexml(infile,mapfile):
-    start = ""
-    with open(infile,'r',encoding='utf-8-sig') as file:
+def xmlstart(filename):
+    with open(filename,'r',encoding='utf-8-sig') as file:
         for line in file:
             if line[:5] == "<?xml" and line[-3:] == "?>\n":                
-                start = line
-                break
-    indata = readxml(infile)
-    if mapfile:
-        mapdata = readxml(mapfile)
-    else:
-        mapdata = DNE
-    indata = xmlmap(indata,mapdata)
-    writexml(infile,indata,start)
+                return line
+    return ""
 
 
 ### Map Binaries mapping
 
+def mapcachefile(base):
+    #named by the hash of the base path, so it is always right in the cache folder
+    return mapcachedir+"/"+hashlib.sha256(base.encode('utf-8')).hexdigest()+".pickle"
+
 if can_mapper:
     def cachemapchange(cache, mapfile):
         map_json = []
@@ -343,79 +502,74 @@ if can_mapper:
             map_json = json.load(f)
             
         if reserved_append in map_json:
-            if reserved_append not in cache:
-                cache[reserved_append] = []
-            
-            for json_dict in  map_json[reserved_append]:
-                cache[reserved_append].append(json_dict)
+            cache.setdefault(reserved_append, []).extend(map_json[reserved_append])
 
         if reserved_delete in map_json:
-            if reserved_delete not in cache:
-                cache[reserved_delete] = []
-            
-            #merge delete values into the cache[reserved_delete]
-            for id in  map_json[reserved_delete]:
-                if id not in cache[reserved_delete]:
-                    cache[reserved_delete].append(id)
+            cache.setdefault(reserved_delete, set()).update(map_json[reserved_delete])
 
         if reserved_replace in map_json:
-            if reserved_replace not in cache:
-                cache[reserved_replace] = {}
+            replace = cache.setdefault(reserved_replace, {})
             
-            #merge replace values into the cache[reserved_replace]
-            for json_dict in  map_json[reserved_replace]:
-                id = json_dict["Id"]
-
-                if not id in cache[reserved_replace]:
-                    cache[reserved_replace][id] = {}
-
-                for key in json_dict:
-                    if key == "Id":
-                        continue
-                    value = json_dict[key]
-
-                    cache[reserved_replace][id][key] = value
-
-    def findjsonindex(id, json):
-        count = 0
-        for json_dict in json:
-            if json_dict["Id"] == id:
-                return count
-            count = count + 1
-        
-        return -1
+            #merge replace values into the per Id changes
+            for json_dict in map_json[reserved_replace]:
+                changes = replace.setdefault(json_dict["Id"], {})
+                changes.update(json_dict)
+                del changes["Id"]
+
+    def loadmapchanges(base, mapfiles):
+        #merged changes of a base map are cached, keyed by the hashes of its mod files
+        digest = hashlib.sha256()
+        for mapfile in mapfiles:
+            digest.update((mapfile+"\0"+str(filehash(mapfile))+"\0").encode('utf-8'))
+        key = digest.hexdigest()
+        cachefile = mapcachefile(base)
+        try:
+            with open(cachefile, "rb") as f:
+                cachedkey, cache = pickle.load(f)
+            if cachedkey == key:
+                return cache
+        except Exception:
+            pass
+
+        cache = {}
+        for mapfile in mapfiles:
+            cachemapchange(cache, mapfile)
+
+        Path(mapcachedir).mkdir(parents=True, exist_ok=True)
+        with open(cachefile, "wb") as f:
+            pickle.dump((key, cache), f, pickle.HIGHEST_PROTOCOL)
+        return cache
+
+    def mapindex(obstacles):
+        #Id -> index of its first obstacle, as a linear search would find it
+        index = {}
+        for i, obstacle in enumerate(obstacles):
+            index.setdefault(obstacle["Id"], i)
+        return index
 
     def changemap(infile, mapchanges):
         in_json = mapper.DecodeBinaries(infile)
         
         if reserved_append in mapchanges:
-            for json_dict in mapchanges[reserved_append]:
-                    in_json.append(json_dict)
+            in_json.extend(mapchanges[reserved_append])
 
         if reserved_delete in mapchanges:
-            for id in mapchanges[reserved_delete]:
-                json_id = findjsonindex(id, in_json)
-                if json_id >= 0:
-                    del in_json[json_id] 
+            index = mapindex(in_json)
+            deleted = {index[id] for id in mapchanges[reserved_delete] if id in index}
+            if deleted:
+                in_json = [obstacle for i, obstacle in enumerate(in_json) if i not in deleted]
 
         if reserved_replace in mapchanges:
-            for id in mapchanges[reserved_replace]:
-                changes = mapchanges[reserved_replace][id]
-                
-                json_id = findjsonindex(id, in_json)
-
-                if json_id == -1:
-                    LOGGER.error("Cannot find", id, "in map file", infile, "when trying to replace values")
-                for key in changes:
-                    value = changes[key]
-
-                    in_json[json_id][key] = value
-                id = ""
-
-        map_binaries = mapper.EncodeBinaries(in_json)
+            index = mapindex(in_json)
+            for id, changes in mapchanges[reserved_replace].items():
+                json_id = index.get(id)
+                if json_id is None:
+                    LOGGER.error(f"Cannot find {id} in map file {infile} when trying to replace values")
+                    continue
+                in_json[json_id].update(changes)
 
         with open(infile, "wb") as f:
-            f.write(map_binaries) 
+            mapper.EncodeBinariesTo(f, in_json)
 
 ### SJSON mapping
 
@@ -427,24 +581,150 @@ if can_sjson:
             LOGGER.error(repr(e))
             return DNE
 
+    def readsjsonbase(filename):
+        #a pristine base file is the same every run, its parse is kept by content hash
+        digest = filehash(filename)
+        if digest is None:
+            return readsjson(filename)
+        cached = sjsoncachedir+"/"+digest+".pickle"
+        try:
+            with open(cached,'rb') as file:
+                return pickle.load(file)
+        except Exception:
+            pass
+        content = readsjson(filename)
+        if content is not DNE and os.path.exists(storedir+"/"+digest[:2]+"/"+digest):
+            Path(sjsoncachedir).mkdir(parents=True, exist_ok=True)
+            with open(cached+"."+str(os.getpid()),'wb') as file:
+                pickle.dump(content,file,pickle.HIGHEST_PROTOCOL)
+            os.replace(cached+"."+str(os.getpid()),cached)
+        return content
+
     def writesjson(filename,content):
         if not isinstance(filename,str):
             return
-        if isinstance(content,OrderedDict):
-            content = sjson.dumps(content, 2)
-        else:
-            content = ""
-        with open(filename,'w',encoding='utf-8') as f:
-            f.write(content)
+        #sjson.dump writes while it walks the tree, the buffer batches its writes
+        with open(filename,'w',encoding='utf-8',buffering=1<<16) as f:
+            if isinstance(content,OrderedDict):
+                sjson.dump(content,f,2)
+
+    def sjsonpred(dat,mat):
+        if (it := safepairs(mat)) is not DNE:
+            return all(sjsonpred(dat[k],v) for k,v in it)
+        return dat == mat
+
+    def leafpath(mat):
+        #key path of the first value sjsonpred compares, if it is a scalar
+        path = ()
+        while isinstance(mat,OrderedDict):
+            if not mat:
+                return None
+            k,mat = next(iter(mat.items()))
+            path += (k,)
+        if isinstance(mat,(str,int,float)) or mat is None:
+            return path,mat
+        return None
+
+    def fetch(dat,path):
+        for k in path:
+            dat = dat[k]
+        return dat
+
+    def hashable(value):
+        try:
+            hash(value)
+        except TypeError:
+            return False
+        return True
+
+    def unshared(indata,keys):
+        #no container is reachable from two elements, so mapping one element
+        #cannot change what the index holds for another
+        owners = {}
+        for i,k in enumerate(keys):
+            stack = [indata[k]]
+            while stack:
+                node = stack.pop()
+                if isinstance(node,(list,dict)):
+                    owner = owners.setdefault(id(node),i)
+                    if owner != i:
+                        return False
+                    stack.extend(node.values() if isinstance(node,dict) else node)
+        return True
+
+    #elements are looked up by the first scalar each query compares instead of
+    #testing every element, one hash index per key path; an element found is
+    #still tested with sjsonpred, and whenever the index could disagree with a
+    #full scan (a lookup raising, elements sharing data) the scan is used
+    class sjsonindex():
+        def __init__(self,indata):
+            self.indata = indata
+            self.keys = [k for k,v in safepairs(indata)]
+            self.paths = {}
+            self.usable = None
+
+        def build(self,path):
+            values = []
+            buckets = defaultdict(list)
+            for i,k in enumerate(self.keys):
+                try:
+                    value = fetch(self.indata[k],path)
+                except Exception:
+                    return None
+                values.append(value)
+                if hashable(value):
+                    buckets[value].append(i)
+            return values,buckets
+
+        def search(self,matdata,mapdata):
+            global dnecopy
+            leaf = leafpath(matdata) if self.usable is not False else None
+            if leaf and self.usable is None:
+                self.usable = unshared(self.indata,self.keys)
+                leaf = leaf if self.usable else None
+            if leaf and leaf[0] not in self.paths:
+                self.paths[leaf[0]] = self.build(leaf[0])
+            if leaf and self.paths[leaf[0]]:
+                candidates = list(self.paths[leaf[0]][1].get(leaf[1],()))
+            else:
+                candidates = range(len(self.keys))
+            matches = []
+            for i in candidates:
+                k = self.keys[i]
+                v = self.indata[k]
+                if sjsonpred(v,matdata):
+                    self.indata[k] = sjsonmap(v,mapdata)
+                    if self.indata[k] is DNE:
+                        dneholders.append(self.indata)
+                    matches.append(i)
+            #one mapping may now be shared by the elements it was applied to
+            if len(matches) > 1:
+                dnecopy = True
+                self.usable = False
+            elif matches and self.paths:
+                self.update(matches[0])
+
+        def update(self,i):
+            v = self.indata[self.keys[i]]
+            for path,index in self.paths.items():
+                if index is None:
+                    continue
+                values,buckets = index
+                if hashable(values[i]):
+                    buckets[values[i]].remove(i)
+                try:
+                    values[i] = fetch(v,path)
+                except Exception:
+                    self.paths[path] = None
+                    continue
+                if hashable(values[i]):
+                    insort(buckets[values[i]],i)
 
     def sjsonsearch(indata,queries):
-        def pred(dat,mat):
-            if (it := safepairs(mat)) is not DNE:
-                return all(pred(dat[k],v) for k,v in it)
-            return dat == mat
-        for matdata,mapdata in queries:
-            for k,v in ((k,v) for k,v in safepairs(indata) if pred(v,matdata)):
-                indata[k] = sjsonmap(v,mapdata)
+        if isinstance(indata,(list,OrderedDict)):
+            index = sjsonindex(indata)
+            for matdata,mapdata in queries:
+                index.search(matdata,mapdata)
         return indata
 
 
@@ -464,10 +744,12 @@ if can_sjson:
                 except ValueError:
                     continue
             mapdata = S
+            dneholders.append(S)
         if type(indata)==type(mapdata):
             if isinstance(mapdata,list) and safeget(mapdata,0) == reserved_append:
                 for i in range(1,len(mapdata)):
                     indata.append(mapdata[i])
+                dneholders.append(indata)
                 return indata
             if isinstance(mapdata,list):
                 if safeget(mapdata,0)==reserved_search:
@@ -486,18 +768,10 @@ if can_sjson:
             if (it := safepairs(mapdata)) is not DNE:
                 for k,v in it:
                     indata[k] = sjsonmap(safeget(indata,k),v)
+                    if indata[k] is DNE:
+                        dneholders.append(indata)
                 return indata
         return mapdata
-        
-    def mergesjson(infile,mapfile):
-        indata = readsjson(infile)
-        if mapfile:
-            mapdata = readsjson(mapfile)
-        else:
-            mapdata = DNE
-        indata = sjsonmap(indata,mapdata)
-        indata = clearDNE(indata)
-        writesjson(infile,indata)
 
 ## FILE/MOD CONTROL
 
@@ -520,6 +794,44 @@ class modcode():
     def __repr__(self) -> str:
         return f"{self.data} {self.ep}"
 
+#a base file parsed once, merged in memory with each of its XML or SJSON mods
+#in priority order, then serialized once
+class document():
+    def __init__(self,filename,mode):
+        self.filename = filename
+        self.mode = mode
+        self.modes = {mode}
+        self.merges = 0
+        if mode == mode_xml:
+            self.start = xmlstart(filename)
+            self.data = readxml(filename)
+        else:
+            self.data = readsjsonbase(filename)
+
+    def merge(self,mapfile):
+        if self.mode == mode_xml:
+            mapdata = readxml(mapfile) if mapfile else DNE
+            self.data = xmlmap(self.data,mapdata)
+        else:
+            #a merged document that is not a table is taken as an empty one
+            if self.merges and not isinstance(self.data,OrderedDict):
+                self.data = OrderedDict()
+            mapdata = readsjson(mapfile) if mapfile else DNE
+            try:
+                self.data = compactDNE(sjsonmap(self.data,mapdata))
+            finally:
+                #a merge that raised must not leave its containers to the next one
+                resetDNE()
+        self.merges += 1
+
+    def write(self):
+        if self.mode == mode_xml:
+            writexml(self.filename,self.data,self.start)
+        else:
+            writesjson(self.filename,self.data)
+        #number of base file round trips saved
+        return self.merges-1
+
 def strup(string):
     return string[0].upper()+string[1:]
 
@@ -528,23 +840,54 @@ gamedir = os.path.join(os.path.realpath(gamerel), '').replace("\\","/")[:-1]
 game = strup(gamedir.split("/")[-1])
 game = game_aliases.get(game,game)
 
+#real paths are resolved a folder at a time and remembered, so each further
+#file in a known folder costs one lstat instead of one per path component
+class pathresolver():
+    def __init__(self,root,backup,exclude):
+        self.root = root
+        self.backup = backup
+        self.exclude = exclude
+        self.folders = {}
+        self.paths = {}
+
+    def realpath(self,path):
+        real = self.paths.get(path)
+        if real is None:
+            parts = path.replace("\\","/").split("/")
+            #symlinks must be resolved before a parent reference is applied
+            if ".." in parts or os.path.islink(path):
+                real = os.path.realpath(path)
+            else:
+                head,tail = os.path.split(os.path.abspath(path))
+                folder = self.folders.get(head)
+                if folder is None:
+                    folder = self.folders[head] = os.path.realpath(head)
+                real = os.path.join(folder,tail) if tail else folder
+            real = real.replace("\\","/")
+            self.paths[path] = real
+        return real
+
+    def contains(self,file,nobackup=True):
+        file = self.realpath(file)
+        if file == self.exclude:
+            return False
+        if nobackup and within(file,self.backup):
+            return False
+        return within(file,self.root)
+
+def within(file,folder):
+    return file == folder or file.startswith(folder+"/")
+
+resolver = pathresolver(gamedir+"/"+scope,gamedir+"/"+scope+"/"+bakdir,selffile)
+
 def in_directory(file,nobackup=True):
     ##if file.find(".pkg") == -1:
     ##    if not os.path.isfile(file):
     ##        return False
-    file = os.path.realpath(file).replace("\\","/")
-    if file == selffile:
-        return False
-    if nobackup:
-        if os.path.commonprefix([file, gamedir+"/"+scope+"/"+bakdir]) == gamedir+"/"+scope+"/"+bakdir:
-            return False
-    return os.path.commonprefix([file, gamedir+"/"+scope]) == gamedir+"/"+scope
+    return resolver.contains(file,nobackup)
 
 def valid_scan(file):
-    if os.path.exists(file):
-        if os.path.isdir(file):
-            return True
-    return False
+    return os.path.isdir(file)
 
 def splitlines(body):
     glines = map(lambda s: s.strip().split("\""),body.split("\n"))
@@ -609,7 +952,40 @@ def tokenise(line):
 def startswith(tokens,keyword,n):
     return tokens[:len(keyword)] == keyword and len(tokens)>=len(keyword)+1
 
-def loadcommand(reldir,tokens,to,n,mode,**load):
+#the discovery of one mod, kept apart so mods can be read concurrently and
+#then merged in folder order exactly as if they had been read one by one
+class modscan():
+    def __init__(self,filename):
+        self.filename = filename
+        self.codes = []
+        self.records = []
+        self.error = None
+
+    def info(self,msg):
+        self.records.append(msg)
+
+    def add(self,path,code,reverse):
+        self.codes.append((path,code,reverse))
+
+    def run(self):
+        try:
+            loadmodfile(self.filename,scan=self)
+        except Exception as e:
+            self.error = e
+        return self
+
+    def merge(self):
+        for msg in self.records:
+            LOGGER.info(msg)
+        if self.error:
+            raise self.error
+        for path,code,reverse in self.codes:
+            if reverse:
+                codes[path].appendleft(code)
+            else:
+                codes[path].append(code)
+
+def loadcommand(reldir,tokens,to,n,mode,scan,**load):
     for path in to:
         if in_directory(path):
             args = [tokens[i::n] for i in range(n)]
@@ -619,7 +995,8 @@ def loadcommand(reldir,tokens,to,n,mode,**load):
                 
                 num = -1
                 for source in sources:
-                    LOGGER.info(source)
+                    scan.info(source)
+                    probe(source)
                     if valid_scan(source):
                         tpath = []
                         for file in os.scandir(source):
@@ -638,92 +1015,214 @@ def loadcommand(reldir,tokens,to,n,mode,**load):
                         load["ep"] = load.get("ep",default_priority)
                         if load.get("reverse",False):
                             load["ep"] = -load["ep"]
-                            codes[path].appendleft(modcode(*codeargs,**load))
+                            scan.add(path,modcode(*codeargs,**load),True)
                         else:
-                            codes[path].append(modcode(*codeargs,**load))
-
-def loadmodfile(filename,echo=True):
+                            scan.add(path,modcode(*codeargs,**load),False)
+
+parsecache = {} #parsed commands per modfile from the last run
+parsewritten = 0 #modification time of the parse cache file
+parsed = {} #parsed commands per modfile read in this run
+
+def readmodfile(filename):
+    #parsed commands of a modfile, reused while the modfile is unchanged
+    stat = filestat(filename)
+    entry = parsecache.get(filename)
+    if entry and stat and entry["stat"] == stat and not racy(stat,parsewritten):
+        parsed[filename] = entry
+        return entry["commands"]
+    try:
+        with open(filename,'rb') as file:
+            data = file.read()
+    except IOError:
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    if entry and entry["hash"] == digest:
+        parsed[filename] = {"stat":stat,"hash":digest,"commands":entry["commands"]}
+        return entry["commands"]
+    body = data.decode('utf-8-sig').replace("\r\n","\n").replace("\r","\n")
+    commands = []
+    for line in splitlines(body):
+        tokens = tokenise(line)
+        if len(tokens)>0:
+            commands.append((tokens,line))
+    parsed[filename] = {"stat":stat,"hash":digest,"commands":commands}
+    return commands
+
+def readparsecache():
+    global parsecache, parsewritten, parsed
+    parsed = {}
+    stat = filestat(parsecachefile)
+    parsewritten = stat[1] if stat else 0
+    try:
+        with open(parsecachefile,'rb') as file:
+            parsecache = pickle.load(file)
+    except Exception:
+        parsecache = {}
+
+def writeparsecache():
+    Path(statedir).mkdir(parents=True, exist_ok=True)
+    with open(parsecachefile,'wb') as file:
+        pickle.dump(parsed,file,pickle.HIGHEST_PROTOCOL)
+
+def loadmodfile(filename,echo=True,scan=None):
+    if scan is None:
+        #outside a discovery scan the commands go straight into codes
+        scan = modscan(filename)
+        loadmodfile(filename,echo,scan)
+        scan.merge()
+        return
+    probe(filename)
     if in_directory(filename):
         
-        try:
-            file = open(filename,'r',encoding='utf-8-sig')
-        except IOError:
+        commands = readmodfile(filename)
+        if commands is None:
             return
         if echo:
-            LOGGER.info(filename)
+            scan.info(filename)
 
         reldir = "/".join(filename.split("/")[:-1])
         ep = 100
         to = default_to[game]
         
-        with file:
-            for line in splitlines(file.read()):
-                tokens = tokenise(line) 
-                if len(tokens)==0:
-                    continue
+        for tokens,line in commands:
+            if startswith(tokens,kwrd_to,0):
+                to = [s.replace("\\","/") for s in tokens[1:]]
+                if len(to) == 0:
+                    to = default_to[game]
+            elif startswith(tokens,kwrd_load,0):
+                n = len(kwrd_load)+len(kwrd_priority)
+                if tokens[len(kwrd_load):n] == kwrd_priority:
+                    if len(tokens)>n:
+                        try:
+                            ep = int(tokens[n])
+                        except ValueError:
+                            pass
+                    else:
+                        ep = default_priority
+            elif startswith(tokens,kwrd_priority,0):
+                n = len(kwrd_priority)
+                if tokens[:n] == kwrd_priority:
+                    if len(tokens)>n:
+                        try:
+                            ep = int(tokens[n])
+                        except ValueError:
+                            pass
+                    else:
+                        ep = default_priority
+            elif startswith(tokens,kwrd_include,1):
+                for s in tokens[1:]:
+                    path = reldir+"/"+s.replace("\"","").replace("\\","/")
+                    probe(path)
+                    if valid_scan(path):
+                        for file in os.scandir(path):
+                            loadmodfile(file.path.replace("\\","/"),echo,scan)
+                    else:
+                        loadmodfile(path,echo,scan)
+            elif startswith(tokens,kwrd_replace,1):
+                loadcommand(reldir,tokens[len(kwrd_replace):],to,1,mode_replace,scan,ep=ep)
+            elif startswith(tokens,kwrd_import,1):
+                loadcommand(reldir,tokens[len(kwrd_import):],to,1,mode_lua,scan,ep=ep)
+            elif startswith(tokens,kwrd_topimport,1):
+                loadcommand(reldir,tokens[len(kwrd_topimport):],to,1,mode_lua_alt,scan,ep=ep,reverse=True)
+            elif startswith(tokens,kwrd_xml,1):
+                loadcommand(reldir,tokens[len(kwrd_xml):],to,1,mode_xml,scan,ep=ep)
+            elif startswith(tokens,kwrd_csv,1):
+                loadcommand(reldir,tokens[len(kwrd_csv):],to,1,mode_csv,scan,ep=ep)
+            elif can_sjson and startswith(tokens,kwrd_sjson,1):
+                loadcommand(reldir,tokens[len(kwrd_sjson):],to,1,mode_sjson,scan,ep=ep)
+            elif can_mapper and startswith(tokens, kwrd_map,1):
+                loadcommand(reldir, tokens[len(kwrd_map):],to,1,mode_map,scan,ep=ep)
+            else:
+                raise Exception(f"Improper command from {filename}:\n\t{line}")
 
-                elif startswith(tokens,kwrd_to,0):
-                    to = [s.replace("\\","/") for s in tokens[1:]]
-                    if len(to) == 0:
-                        to = default_to[game]
-                elif startswith(tokens,kwrd_load,0):
-                    n = len(kwrd_load)+len(kwrd_priority)
-                    if tokens[len(kwrd_load):n] == kwrd_priority:
-                        if len(tokens)>n:
-                            try:
-                                ep = int(tokens[n])
-                            except ValueError:
-                                pass
-                        else:
-                            ep = default_priority
-                elif startswith(tokens,kwrd_priority,0):
-                    n = len(kwrd_priority)
-                    if tokens[:n] == kwrd_priority:
-                        if len(tokens)>n:
-                            try:
-                                ep = int(tokens[n])
-                            except ValueError:
-                                pass
-                        else:
-                            ep = default_priority
-                elif startswith(tokens,kwrd_include,1):
-                    for s in tokens[1:]:
-                        path = reldir+"/"+s.replace("\"","").replace("\\","/")
-                        if valid_scan(path):
-                            for file in os.scandir(path):
-                                loadmodfile(file.path.replace("\\","/"),echo)
-                        else:
-                            loadmodfile(path,echo)
-                elif startswith(tokens,kwrd_replace,1):
-                    loadcommand(reldir,tokens[len(kwrd_replace):],to,1,mode_replace,ep=ep)
-                elif startswith(tokens,kwrd_import,1):
-                    loadcommand(reldir,tokens[len(kwrd_import):],to,1,mode_lua,ep=ep)
-                elif startswith(tokens,kwrd_topimport,1):
-                    loadcommand(reldir,tokens[len(kwrd_topimport):],to,1,mode_lua_alt,ep=ep,reverse=True)
-                elif startswith(tokens,kwrd_xml,1):
-                    loadcommand(reldir,tokens[len(kwrd_xml):],to,1,mode_xml,ep=ep)
-                elif startswith(tokens,kwrd_csv,1):
-                    loadcommand(reldir,tokens[len(kwrd_csv):],to,1,mode_csv,ep=ep)
-                elif can_sjson and startswith(tokens,kwrd_sjson,1):
-                    loadcommand(reldir,tokens[len(kwrd_sjson):],to,1,mode_sjson,ep=ep)
-                elif can_mapper and startswith(tokens, kwrd_map,1):
-                    loadcommand(reldir, tokens[len(kwrd_map):],to,1,mode_map,ep=ep)
-                else:
-                    raise Exception(f"Improper command from {filename}:\n\t{line}")
+## BACKUP STORE
 
-def isedited(base):
+def clonefile(src,dst):
+    #reflink where the filesystem supports it, else a plain copy
+    if fcntl:
+        try:
+            with open(src,'rb') as srcfile, open(dst,'wb') as dstfile:
+                fcntl.ioctl(dstfile.fileno(),FICLONE,srcfile.fileno())
+            return
+        except OSError:
+            pass
+    copyfile(src,dst)
+
+def linkfile(src,dst):
+    #hard link where the filesystem supports it, else a clone
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src,dst)
+    except OSError:
+        clonefile(src,dst)
+
+def storefile(filename):
+    digest = filehash(filename)
+    obj = storedir+"/"+digest[:2]+"/"+digest
+    if not os.path.exists(obj):
+        Path(storedir+"/"+digest[:2]).mkdir(parents=True, exist_ok=True)
+        #workers (--jobs) may store the same content at the same time
+        temp = obj+"."+str(os.getpid())
+        clonefile(filename,temp)
+        try:
+            os.replace(temp,obj)
+        except OSError:
+            if not os.path.exists(obj):
+                raise
+            os.remove(temp)
+    return obj
+
+def backupfile(filename,bakpath):
+    #the base file is never linked, edits in place must not reach the store
+    linkfile(storefile(filename),bakpath)
+
+def restorefile(bakpath,filename):
+    #a base file which already is its original is left alone
+    stat = filestat(filename)
+    if stat and stat[0] == filestat(bakpath)[0] and filehash(filename) == filehash(bakpath):
+        return
+    clonefile(bakpath,filename)
+
+def pruneobjects(manifest):
+    used = {entry.get("original") for entry in manifest.values()}
+    if valid_scan(storedir):
+        for folder in os.scandir(storedir):
+            for obj in os.scandir(folder.path):
+                if obj.name not in used:
+                    os.remove(obj.path)
+    if valid_scan(sjsoncachedir):
+        for cached in os.scandir(sjsoncachedir):
+            if cached.name.split(".")[0] not in used:
+                os.remove(cached.path)
+    if valid_scan(mapcachedir):
+        maps = {mapcachefile(base).split("/")[-1] for base in manifest}
+        for cached in os.scandir(mapcachedir):
+            if cached.is_dir(follow_symlinks=False):
+                rmtree(cached.path)
+            elif cached.name not in maps:
+                os.remove(cached.path)
+
+def isedited(base,entry=None):
+    #recorded by the last run and untouched since
+    if entry and entry.get("editedstat") and filestat(base) == entry["editedstat"]:
+        return True
     if not (".lua" in base or ".xml" in base or ".sjson" in base or ".csv" in base):
         return True
-    with open(base,'r',encoding='utf-8-sig') as basefile:
-        for line in basefile:
-              if modified+modified_modrep in line:
-                  return True
-    return False
+    #makeedit always appends the marker, only the end of the file is read
+    with open(base,'rb') as basefile:
+        size = basefile.seek(0,os.SEEK_END)
+        basefile.seek(max(0,size-markertail))
+        return (modified+modified_modrep).encode('utf-8') in basefile.read()
          
 def sortmods(mods):
     return sorted(mods,key=lambda x: x.ep)
 
 def makeedit(base,mods,echo=True):
+    with profile(base,"base"):
+        return editbase(base,mods,echo)
+
+def editbase(base,mods,echo):
     Path("/".join(base.split("/")[:-1])).mkdir(parents=True, exist_ok=True)
     Path(bakdir+"/"+"/".join(base.split("/")[:-1])).mkdir(parents=True, exist_ok=True)
     if not os.path.exists(base):
@@ -731,39 +1230,55 @@ def makeedit(base,mods,echo=True):
     else:
         bakpath = bakdir+"/"+base+baktype
         if isedited(base) and in_directory(bakpath,False) and os.path.exists(bakpath):
-            copyfile(bakpath,base)
+            restorefile(bakpath,base)
         else:
-            copyfile(base,bakpath)
+            backupfile(base,bakpath)
     if echo:
         i=0
         LOGGER.info("\n"+base)
+    avoided = 0
     try:
-        cached_map_changes = {}
+        mapfiles = []
+        doc = None
         for mod in mods:
-            if mod.mode == mode_replace:
-                copyfile(mod.data[0],base)
-            elif mod.mode == mode_lua:
-                addimport(base,mod.data[0])
-            elif mod.mode == mode_lua_alt:
-                addtopimport(base,mod.data[0])
-            elif mod.mode == mode_xml:
-                mergexml(base,mod.data[0])
-            elif mod.mode == mode_sjson:
-                mergesjson(base,mod.data[0])
-            elif mod.mode == mode_map:
-                cachemapchange(cached_map_changes, mod.data[0])
-                # mergemap(base,)
+            if doc and mod.mode not in doc.modes:
+                with profile(base,"write"):
+                    avoided += doc.write()
+                doc = None
+            with profile(mod.src,"mod"):
+                if mod.mode == mode_replace:
+                    copyfile(mod.data[0],base)
+                elif mod.mode in {mode_lua,mode_lua_alt}:
+                    if not doc:
+                        doc = imports(base)
+                    doc.add(mod.data[0],mod.mode == mode_lua_alt)
+                elif mod.mode in {mode_xml,mode_sjson}:
+                    if not doc:
+                        doc = document(base,mod.mode)
+                    doc.merge(mod.data[0])
+                elif mod.mode == mode_csv:
+                    if not doc:
+                        doc = csvpatch(base)
+                    doc.add(mod.data[0])
+                elif mod.mode == mode_map:
+                    mapfiles.append(mod.data[0])
             if echo:
                 k = i+1
                 for s in mod.src.split('\n'):
                     i+=1
                     LOGGER.info(" #"+str(i)+" +"*(k<i)+" "*((k>=i)+5-len(str(i)))+s)
+        if doc:
+            with profile(base,"write"):
+                avoided += doc.write()
         
-        if len(cached_map_changes) > 0:
-            changemap(base, cached_map_changes)
+        if mapfiles:
+            with profile(base,"map"):
+                changemap(base, loadmapchanges(base, mapfiles))
     except Exception as e:
-        copyfile(bakdir+"/"+base+baktype,base)
+        restorefile(bakdir+"/"+base+baktype,base)
         raise RuntimeError("Encountered uncaught exception while implementing mod changes") from e
+    if avoided:
+        LOGGER.debug(f"{base}: {avoided} file round trip"+"s"*(avoided!=1)+" avoided")
 
     modifiedstr = ""
     if mods[0].mode in {mode_lua,mode_lua_alt}:
@@ -778,12 +1293,39 @@ def makeedit(base,mods,echo=True):
         modifiedstr = modified_map
     with open(base,'a',encoding='utf-8') as basefile:
         basefile.write(modifiedstr.replace(modified,modified+modified_modrep+str(datetime.now())))
-
-def cleanup(folder=bakdir,echo=True):
+    return avoided
+
+class logbuffer(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno,self.format(record)))
+
+def makeeditjob(base,mods,signature,level,profiling):
+    global profiler
+    LOGGER.setLevel(level)
+    LOGGER.propagate = False
+    buffer = logbuffer()
+    LOGGER.addHandler(buffer)
+    profiler = [] if profiling else None
+    try:
+        avoided = makeedit(base,mods)
+        return buffer.records, manifestentry(base,signature), avoided, None, profiler
+    except Exception:
+        return buffer.records, None, 0, traceback.format_exc(), profiler
+    finally:
+        LOGGER.removeHandler(buffer)
+
+def cleanup(folder=bakdir,echo=True,keep=frozenset(),manifest={}):
     if valid_scan(folder):
         empty = True
         for content in os.scandir(folder):
-            if cleanup(content,echo):
+            if content.path.replace("\\","/") == statedir:
+                empty = False
+                continue
+            if cleanup(content,echo,keep,manifest):
                 empty = False
         if empty:
             os.rmdir(folder)
@@ -792,6 +1334,8 @@ def cleanup(folder=bakdir,echo=True):
     path = folder.path[len(bakdir)+1:]
     if path.find(".del") == len(path)-len(".del"):
         path = path[:-len(".del")]
+        if path.replace("\\","/") in keep:
+            return True
         if echo:
             LOGGER.info(path)
         if os.path.exists(path):
@@ -799,52 +1343,422 @@ def cleanup(folder=bakdir,echo=True):
         if os.path.exists(folder.path):
             os.remove(folder.path)
         return False
+    if path.replace("\\","/") in keep:
+        return True
     if os.path.isfile(path):
-        if isedited(path):
+        if isedited(path,manifest.get(path.replace("\\","/"))):
             if echo:
                 LOGGER.info(path)
-            copyfile(folder.path,path)
+            restorefile(folder.path,path)
             os.remove(folder.path)
             return False
         os.remove(folder.path)
         return False
     return True
 
-def start():
-    global codes
+## INCREMENTAL INSTALL
+
+def filehash(filename):
+    if not os.path.isfile(filename):
+        return None
+    digest = hashlib.sha256()
+    with open(filename,'rb') as file:
+        for chunk in iter(lambda: file.read(1<<20),b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def modsignature(mods):
+    return [[mod.mode,mod.ep,[[s,filehash(s)] for s in mod.data]] for mod in mods]
+
+def readmanifest():
+    try:
+        with open(statedir+"/"+manifestfile,'r',encoding='utf-8') as file:
+            return json.load(file)
+    except (IOError,ValueError):
+        return {}
+
+def writemanifest(manifest):
+    Path(statedir).mkdir(parents=True, exist_ok=True)
+    with open(statedir+"/"+manifestfile,'w',encoding='utf-8') as file:
+        json.dump(manifest,file,indent=1)
+
+def filestat(filename):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_size,stat.st_mtime_ns]
+
+def racy(stat,written):
+    #modified within a timestamp tick of when the cache was written, the file may
+    #have changed again since without its size or modification time changing
+    return stat[1] >= written-racytick
+
+def samefile(filename,digest,stat):
+    #same size and modification time as recorded, or else same content
+    if stat and filestat(filename) == stat:
+        return True
+    return filehash(filename) == digest
+
+def manifestentry(base,signature):
+    bakpath = bakdir+"/"+base+baktype
+    return {"original":filehash(bakpath),"originalstat":filestat(bakpath),"mods":signature,
+            "edited":filehash(base),"editedstat":filestat(base)}
+
+def isunchanged(base,entry,signature):
+    if not entry or entry.get("mods") != signature:
+        return False
+    bakpath = bakdir+"/"+base+baktype
+    if entry.get("original") is None:
+        if not os.path.exists(bakpath+".del"):
+            return False
+    elif not samefile(bakpath,entry["original"],entry.get("originalstat")):
+        return False
+    return samefile(base,entry.get("edited"),entry.get("editedstat"))
+
+codes = defaultdict(deque) #mods found for each base file
+probed = {} #stat of each mod path the plan depends on
+
+def probe(path):
+    #the plan depends on which mod paths exist and what the scanned folders hold
+    probed[path] = filestat(path)
+
+def discover(persist=True):
+    global codes, probed
     codes = defaultdict(deque)
+    probed = {}
+    readparsecache()
+    probe(modsdir)
+    mods = [mod.path.replace("\\","/")+"/"+modfile for mod in os.scandir(modsdir)]
+    with ThreadPoolExecutor(max_workers=scanthreads) as pool:
+        for scan in pool.map(lambda filename: modscan(filename).run(),mods):
+            scan.merge()
+    if persist:
+        writeparsecache()
+    return {base:sortmods(mods) for base,mods in codes.items()}
+
+def readplanlock():
+    written = filestat(statedir+"/"+planfile)
+    if written is None:
+        return None
+    try:
+        with open(statedir+"/"+planfile,'r',encoding='utf-8') as file:
+            lock = json.load(file)
+    except (IOError,ValueError):
+        return None
+    if not isinstance(lock,dict) or lock.get("game") != game or lock.get("scope") != scope:
+        return None
+    #an old or truncated lock file is a miss, discovery runs instead
+    if not isinstance(lock.get("probes"),dict) or not isinstance(lock.get("plan"),dict):
+        return None
+    for path,stat in lock["probes"].items():
+        if filestat(path) != stat:
+            return None
+        #a path changed this close to the lock may have changed again unseen
+        if stat and racy(stat,written[1]):
+            return None
+    try:
+        return {base:[modcode("\n".join(data),tuple(data),mode,base,ep=ep) for mode,ep,data in mods]
+                for base,mods in lock["plan"].items()}
+    except (TypeError,ValueError):
+        return None
+
+def writeplanlock(plan):
+    lock = {"game":game,"scope":scope,"probes":probed,
+            "plan":{base:[[mod.mode,mod.ep,list(mod.data)] for mod in mods] for base,mods in plan.items()}}
+    Path(statedir).mkdir(parents=True, exist_ok=True)
+    with open(statedir+"/"+planfile,'w',encoding='utf-8') as file:
+        json.dump(lock,file,indent=1)
+
+mode_names = {mode_lua:"Import",mode_lua_alt:"Top Import",mode_xml:"XML",mode_sjson:"SJSON",
+              mode_replace:"Replace",mode_csv:"CSV",mode_map:"Map"}
+
+def filesize(filename):
+    stat = filestat(filename)
+    return stat[0] if stat else 0
+
+def sizestr(size):
+    for unit in ("B","KB","MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+def editcost(base,mods):
+    #rough bytes makeedit reads and writes for a base file, and the files it
+    #parses, following its batching: the original is copied to the backup and
+    #hashed for the manifest, every mod file is hashed for the signature
+    bakpath = bakdir+"/"+base+baktype
+    size = filesize(bakpath) if os.path.exists(bakpath) else filesize(base)
+    read = 2*size+sum(filesize(s) for mod in mods for s in mod.data)
+    written = size
+    passes = 0
+    group = None
+    top = False
+    lines = 0
+    mapfiles = []
+    for mod in mods:
+        if group and mod.mode not in group:
+            if group == {mode_lua,mode_lua_alt}:
+                read += size*top
+                written += size*top+lines
+                size += lines
+            else:
+                written += size
+            group = None
+        modsize = filesize(mod.data[0])
+        if mod.mode == mode_replace:
+            read += modsize
+            written += modsize
+            size = modsize
+        elif mod.mode in {mode_lua,mode_lua_alt}:
+            if not group:
+                group = {mode_lua,mode_lua_alt}
+                top = False
+                lines = 0
+            top = top or mod.mode == mode_lua_alt
+            lines += len(modsrel+mod.data[0])+10
+        elif mod.mode in {mode_xml,mode_sjson,mode_csv}:
+            if not group:
+                group = {mod.mode}
+                read += size
+                passes += 1
+            read += modsize
+            passes += 1
+        elif mod.mode == mode_map:
+            mapfiles.append(modsize)
+    if group == {mode_lua,mode_lua_alt}:
+        read += size*top
+        written += size*top+lines
+        size += lines
+    elif group:
+        written += size
+    if mapfiles:
+        read += size+sum(mapfiles)
+        written += size
+        passes += 1+len(mapfiles)
+    return read+size,written,passes
+
+def showplan(plan):
+    signatures = {base:modsignature(mods) for base,mods in plan.items()}
+    edited = readmanifest()
+    LOGGER.info("\nEdit plan for "+game+" mods:")
+    totals = [0,0,0]
+    skipped = 0
+    for base,mods in plan.items():
+        if isunchanged(base,edited.get(base),signatures[base]):
+            LOGGER.info("\n"+base+" (unchanged, would be skipped)")
+            skipped += 1
+            continue
+        cost = editcost(base,mods)
+        LOGGER.info("\n"+base+" ("+sizestr(filesize(base))+")")
+        i = 0
+        for mod in mods:
+            for s in mod.src.split('\n'):
+                i += 1
+                LOGGER.info(" #"+str(i)+" "*(6-len(str(i)))+f"{mode_names[mod.mode]:<11}{s} ({sizestr(filesize(s))})")
+        LOGGER.info(f" read {sizestr(cost[0])}, write {sizestr(cost[1])}, {cost[2]} parse pass"+"es"*(cost[2]!=1))
+        totals = [total+c for total,c in zip(totals,cost)]
 
-    LOGGER.info("Cleaning edits... (if there are issues validate/reinstall files)\n")
-    Path(bakdir).mkdir(parents=True, exist_ok=True)
-    cleanup()
+    bs = len(plan)-skipped
+    LOGGER.info("\n"+str(bs)+" base file"+"s"*(bs!=1)+" to edit, "+str(skipped)+" unchanged.")
+    LOGGER.info(f"Estimated total: read {sizestr(totals[0])}, write {sizestr(totals[1])}, {totals[2]} parse pass"+"es"*(totals[2]!=1)+".\n")
 
+def start():
+    if plan_only:
+        LOGGER.info("Reading mod files...\n")
+        plan = readplanlock()
+        if plan is None:
+            plan = discover(persist=False) if valid_scan(modsdir) else {}
+        showplan(plan)
+        LOGGER.info("Dry run, no files were changed.\n")
+        return
+
+    Path(bakdir).mkdir(parents=True, exist_ok=True)
     if clean_only:
+        LOGGER.info("Cleaning edits... (if there are issues validate/reinstall files)\n")
+        with profile("cleanup","phase"):
+            cleanup(manifest=readmanifest())
+            #the store and the caches only serve installs, uninstalling drops them
+            if valid_scan(statedir):
+                rmtree(statedir)
+            if valid_scan(bakdir) and not any(os.scandir(bakdir)):
+                os.rmdir(bakdir)
         LOGGER.info( "Finished cleaning, skipping edits.\n" )
         return
     
-    LOGGER.info("\nReading mod files...\n")
+    LOGGER.info("Reading mod files...\n")
     Path(modsdir).mkdir(parents=True, exist_ok=True)
-    for mod in os.scandir(modsdir):
-        loadmodfile(mod.path.replace("\\","/")+"/"+modfile)
+    with profile("discovery","phase"):
+        plan = readplanlock()
+        if plan is None:
+            plan = discover()
+            writeplanlock(plan)
+        else:
+            LOGGER.info("Mod files unchanged since the last run, reusing the load plan.")
 
-    LOGGER.info("\nModified files for "+game+" mods:")
-    for base, mods in codes.items():
-        LOGGER.debug(f"mods: {mods}")
-        mods = sortmods(mods)
-        LOGGER.debug(f"sorted: {mods}")
-        makeedit(base,mods)
+    with profile("signatures","phase"):
+        signatures = {base:modsignature(mods) for base,mods in plan.items()}
+        edited = readmanifest()
+        keep = {base for base in plan if isunchanged(base,edited.get(base),signatures[base])}
+        manifest = {base:edited[base] for base in keep}
 
-    bs = len(codes)
-    ms = sum(map(len,codes.values()))
+    LOGGER.info("\nCleaning edits... (if there are issues validate/reinstall files)\n")
+    with profile("cleanup","phase"):
+        cleanup(keep=keep,manifest=edited)
+
+    LOGGER.info("\nModified files for "+game+" mods:")
+    for base in plan:
+        if base in keep:
+            LOGGER.info("\n"+base+" (unchanged)")
+    pending = [(base,mods) for base,mods in plan.items() if base not in keep]
+    roundtrips = 0
+    try:
+        with profile("edits","phase"):
+            if jobs > 1 and len(pending) > 1:
+                failed = []
+                with ProcessPoolExecutor(max_workers=jobs) as pool:
+                    futures = [(base,pool.submit(makeeditjob,base,mods,signatures[base],LOGGER.level,profiler is not None))
+                               for base,mods in pending]
+                    for base,future in futures:
+                        records,entry,avoided,error,events = future.result()
+                        roundtrips += avoided
+                        if events:
+                            profiler.extend(events)
+                        for level,msg in records:
+                            LOGGER.log(level,msg)
+                        if error:
+                            LOGGER.error(error)
+                            failed.append(base)
+                        else:
+                            manifest[base] = entry
+                if failed:
+                    raise RuntimeError("Encountered uncaught exception while implementing mod changes to "+", ".join(failed))
+            else:
+                for base,mods in pending:
+                    LOGGER.debug(f"sorted: {mods}")
+                    roundtrips += makeedit(base,mods)
+                    manifest[base] = manifestentry(base,signatures[base])
+    finally:
+        with profile("manifest","phase"):
+            writemanifest(manifest)
+            pruneobjects(manifest)
+
+    bs = len(plan)
+    ms = sum(map(len,plan.values()))
 
     LOGGER.info("\n"+str(bs)+" base file"+"s"*(bs!=1)+" import"+"s"*(bs==1)+" a total of "+str(ms)+" mod file"+"s"*(ms!=1)+".\n")
+    if keep:
+        LOGGER.info(str(len(keep))+" base file"+"s"*(len(keep)!=1)+" unchanged since the last run, skipped.\n")
+    if roundtrips:
+        LOGGER.info(str(roundtrips)+" file round trip"+"s"*(roundtrips!=1)+" avoided by batching edits in memory.\n")
+
+## PROFILING
+
+#spans carry the bytes read and written when psutil is installed and reports
+#them for the process: on Windows, Linux and BSD, not on macOS
+ioprocess = None #psutil handle of this process, made again in a worker
+iocost = (0,0) #bytes one reading of the counters adds to them (/proc on linux)
+ioreads = 0 #readings of the counters so far
+
+def readio():
+    global ioreads
+    counters = ioprocess.io_counters()
+    ioreads += 1
+    #bytes passed to read and write calls, cached or not (chars on linux)
+    return (getattr(counters,"read_chars",counters.read_bytes),
+            getattr(counters,"write_chars",counters.write_bytes))
+
+def iocounters():
+    #bytes read and written by this process so far, and the readings before
+    global ioprocess,iocost
+    if psutil is None or not hasattr(psutil.Process,"io_counters"):
+        return None
+    try:
+        if ioprocess is None or ioprocess.pid != os.getpid():
+            ioprocess = psutil.Process()
+            first = readio()
+            second = readio()
+            iocost = (second[0]-first[0],second[1]-first[1])
+        readings = ioreads
+        return readio()+(readings,)
+    except psutil.Error:
+        return None
+
+class span():
+    def __init__(self,name,cat):
+        self.name = name
+        self.cat = cat
+
+    def __enter__(self):
+        self.io = iocounters()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self,*exc):
+        end = time.perf_counter_ns()
+        io = iocounters()
+        args = {}
+        if self.io and io:
+            readings = io[2]-self.io[2]
+            args = {"read":io[0]-self.io[0]-readings*iocost[0],"written":io[1]-self.io[1]-readings*iocost[1]}
+        profiler.append({"name":self.name,"cat":self.cat,"ph":"X","ts":self.start/1000,"dur":(end-self.start)/1000,
+                         "pid":os.getpid(),"tid":threading.get_ident(),"args":args})
+        return False
+
+class nospan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        return False
+
+idle = nospan()
+
+def profile(name,cat):
+    if profiler is None:
+        return idle
+    return span(name,cat)
+
+def writeprofile(filename):
+    #a Chrome trace (chrome://tracing, Perfetto) with the call counts per span
+    origin = min((event["ts"] for event in profiler),default=0)
+    calls = {}
+    for event in profiler:
+        event["ts"] -= origin
+        total = calls.setdefault(event["cat"]+":"+event["name"],{"calls":0,"dur":0,"read":0,"written":0})
+        total["calls"] += 1
+        total["dur"] += event["dur"]
+        total["read"] += event["args"].get("read",0)
+        total["written"] += event["args"].get("written",0)
+    with open(filename,'w',encoding='utf-8') as file:
+        json.dump({"traceEvents":profiler,"displayTimeUnit":"ms","otherData":{"calls":calls}},file,indent=1)
+
+    LOGGER.info("Profile written to "+filename+"\n")
+    for event in profiler:
+        if event["cat"] == "phase":
+            LOGGER.info(f"{event['name']:<12}{event['dur']/1000:>10.1f} ms"+spanio(event))
+    LOGGER.info("\nSlowest base files and mods:")
+    spans = sorted((event for event in profiler if event["cat"] in {"base","mod"}),key=lambda event: -event["dur"])
+    for event in spans[:profiletop]:
+        name = event["name"].replace("\n",", ")
+        LOGGER.info(f"{event['dur']/1000:>10.1f} ms  {event['cat']:<5}{name}"+spanio(event))
+
+def spanio(event):
+    if not event["args"]:
+        return ""
+    return f"  read {event['args']['read']} B, written {event['args']['written']} B"
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser()
     parser.add_argument( '--game', '-g', choices=[game for game in default_to], help="select game mode" )
     parser.add_argument( '--clean', '-c', action='store_true', help="clean only (uninstall mods)" )
     parser.add_argument('--verbose', '-v', action='store_true', help="verbose mode (default log level if not provided: info, '-v': debug)")
     parser.add_argument('--quiet', '-q', action='store_true', help="quiet mode (only log errors, overrides --verbose if present)")
+    parser.add_argument('--plan', '-p', action='store_true', help="dry run, show the edit plan with estimated I/O without changing any file")
+    parser.add_argument('--jobs', '-j', type=int, default=jobs, help="number of worker processes editing base files in parallel (default: 1, '0': one per CPU)")
+    parser.add_argument('--profile', nargs='?', const="modimporter.profile.json", help="time each phase, base file and mod, write a trace to PROFILE (default: modimporter.profile.json), with bytes read and written when psutil is installed (Windows, Linux)")
     parser.add_argument('--no-input', action='store_false', default=True, dest='input', help="do not prompt for input when done (default: prompt for input)")
     args = parser.parse_args()
     # --game
@@ -852,6 +1766,13 @@ if __name__ == '__main__':
     # --clean
     if args.clean is not None:
         clean_only = args.clean
+    # --plan
+    plan_only = args.plan
+    # --jobs
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    # --profile
+    if args.profile:
+        profiler = []
     # --quiet / --verbose
     if args.quiet:
         LOGGER.setLevel(logging.ERROR)
@@ -874,5 +1795,7 @@ Re-run `modimporter` as administrator.
         ##LOGGER.error("(Run this program again in a terminal that does not close or check the log file if this doesn't work)")
         logging.getLogger("MainExceptions").exception(e)
         ##raise RuntimeError("Encountered uncaught exception during program") from e
+    if profiler is not None:
+        writeprofile(args.profile)
     if args.input:
         input("Press ENTER/RETURN to end program...")